@@ -0,0 +1,230 @@
+# cold archive: incremental Parquet export + DuckDB queries over it
+import json
+import os
+
+from app.config import Config
+from app.utils.database import get_db_connection
+
+# NOTE: pandas / pyarrow / duckdb are imported inside the functions (heavy imports).
+
+# =================
+# Layout (hive-style partitions, read back with hive_partitioning):
+#   <ARCHIVE_DIR>/activities/athlete_id=<id>/year=<yyyy>/month=<mm>/data.parquet
+#   <ARCHIVE_DIR>/weekly_zones/athlete_id=<id>/year=<yyyy>/month=<mm>/data.parquet
+#   <ARCHIVE_DIR>/workouts/user_id=<id>/year=<yyyy>/month=<mm>/data.parquet
+#   <ARCHIVE_DIR>/_watermarks.json   last exported updated_at per table
+#
+# activities and weekly_zones are exported INCREMENTALLY: only rows with
+# updated_at >= the watermark - WATERMARK_MARGIN are read from the DB, and only the
+# partitions they fall in are rewritten (merged on the primary key, newest row wins).
+# workouts have no updated_at (the coach deletes + reinserts them) and are
+# small, so they are re-exported in full every time.
+# =================
+
+ARCHIVE_TABLES = {
+    # table: (primary key, date column used for year/month, owner column)
+    "activities": (["strava_id"], "start_date_local", "athlete_id"),
+    "weekly_zones": (["athlete_id", "week_start", "zone_type", "zone_index"], "week_start", "athlete_id"),
+}
+
+WATERMARKS_FILE = "_watermarks.json"
+
+# updated_at is stamped by the writer BEFORE its transaction commits, so a sync still
+# running during an export can commit rows OLDER than the saved watermark. Each export
+# re-reads this much before the watermark (the merge on the key makes that harmless);
+# it must be longer than any sync / backfill transaction.
+WATERMARK_MARGIN_S = 3600
+
+
+def _archive_dir(archive_dir=None):
+    return archive_dir or Config.ARCHIVE_DIR
+
+
+def load_watermarks(archive_dir=None):
+    path = os.path.join(_archive_dir(archive_dir), WATERMARKS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermarks(watermarks, archive_dir=None):
+    path = os.path.join(_archive_dir(archive_dir), WATERMARKS_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(tmp, path)
+
+
+# -----------------------------------
+# WRITING
+# -----------------------------------
+def _owner_key(owner):
+    """
+    Partition directory name of an owner. NULL -> "0", and 42.0 -> "42": a column with
+    NULLs comes back from pandas as float, and the same athlete must always land in the
+    same partition, or the merge on the key never sees the old copy of a row.
+    """
+    if owner is None or owner != owner:  # None / NaN
+        return "0"
+    if isinstance(owner, float) and owner.is_integer():
+        owner = int(owner)
+    return str(owner).replace(os.sep, "_")
+
+
+def _partition_path(root, owner_col, owner, day):
+    return os.path.join(root, f"{owner_col}={_owner_key(owner)}", f"year={day.year:04d}", f"month={day.month:02d}")
+
+
+def _write_partitions(df, root, key, date_col, owner_col, merge=True):
+    """
+    Writes df into its (owner, year, month) partitions. With merge, the rows already
+    in a partition file are kept unless a new row has the same primary key.
+    Partition columns are in the path only (hive style), not in the file.
+    Returns the number of partitions written.
+    """
+    import pandas as pd
+
+    if df.empty:
+        return 0
+    days = pd.to_datetime(df[date_col])
+    owners = df[owner_col].astype(object).map(_owner_key)
+    groups = df.groupby([owners, days.dt.year, days.dt.month], sort=False)
+    written = 0
+    for (owner, _, _), part in groups:
+        path = _partition_path(root, owner_col, owner, days[part.index[0]])
+        os.makedirs(path, exist_ok=True)
+        target = os.path.join(path, "data.parquet")
+        part = part.drop(columns=[owner_col])
+        if merge and os.path.exists(target):
+            old = pd.read_parquet(target)
+            if owner_col in key:
+                part_key = [k for k in key if k != owner_col]
+            else:
+                part_key = key
+            part = pd.concat([old, part], ignore_index=True).drop_duplicates(part_key, keep="last")
+        tmp = target + ".tmp"
+        part.to_parquet(tmp, index=False)
+        os.replace(tmp, target)  # readers never see a half-written file
+        written += 1
+    return written
+
+
+def _read_sql(cur, sql, params=()):
+    import pandas as pd
+
+    cur.execute(sql, params)
+    columns = [col[0] for col in cur.description]
+    return pd.DataFrame(cur.fetchall(), columns=columns)
+
+
+def export_table(conn, table, archive_dir=None, watermarks=None):
+    """
+    Incremental export of one ARCHIVE_TABLES table. Returns (rows exported, new watermark).
+    Rows updated in the WATERMARK_MARGIN_S before the watermark are exported again:
+    harmless (merge on the key), and rows of a transaction that committed after the
+    last export with an older updated_at are not missed.
+    """
+    import pandas as pd
+
+    key, date_col, owner_col = ARCHIVE_TABLES[table]
+    watermarks = watermarks if watermarks is not None else load_watermarks(archive_dir)
+    since = watermarks.get(table)
+
+    with conn.cursor() as cur:
+        if since:
+            start = pd.Timestamp(since) - pd.Timedelta(seconds=WATERMARK_MARGIN_S)
+            df = _read_sql(cur, f"SELECT * FROM {table} WHERE updated_at >= %s", (str(start),))
+        else:
+            df = _read_sql(cur, f"SELECT * FROM {table}")
+
+    if df.empty:
+        return 0, since
+    root = os.path.join(_archive_dir(archive_dir), table)
+    n_partitions = _write_partitions(df, root, key, date_col, owner_col)
+    newest = df["updated_at"].dropna().max() if "updated_at" in df else None
+    watermark = str(newest) if newest is not None and newest == newest else since  # NaT check
+    if since and watermark and pd.Timestamp(watermark) < pd.Timestamp(since):
+        watermark = since  # only re-exported margin rows: never move the watermark back
+    print(f"🧊 {table}: {len(df)} rows -> {n_partitions} partitions")
+    return len(df), watermark
+
+
+def export_workouts(conn, archive_dir=None):
+    """Full snapshot of the planned workouts (+ plan status), partitioned by user/year/month."""
+    import shutil
+
+    with conn.cursor() as cur:
+        df = _read_sql(cur, """
+            SELECT w.*, p.status AS plan_status, p.goal_description
+            FROM workouts w
+            JOIN training_plans p ON p.plan_id = w.plan_id
+        """)
+    root = os.path.join(_archive_dir(archive_dir), "workouts")
+    tmp_root = root + ".tmp"
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    df = df[df["scheduled_date"].notna()]
+    n_partitions = _write_partitions(df, tmp_root, ["workout_id"], "scheduled_date", "user_id", merge=False)
+    # Swap: move the old snapshot aside, put the new one in place, THEN delete the old one.
+    # Readers lose the directory only between two renames, not for a whole rmtree.
+    old_root = root + ".old"
+    shutil.rmtree(old_root, ignore_errors=True)
+    if os.path.isdir(root):
+        os.replace(root, old_root)
+    if n_partitions:
+        os.replace(tmp_root, root)
+    shutil.rmtree(old_root, ignore_errors=True)
+    print(f"🧊 workouts: {len(df)} rows -> {n_partitions} partitions")
+    return len(df)
+
+
+def run_export(archive_dir=None):
+    """Exports everything that changed since the last run. Used by `python -m app.cli archive`."""
+    print("\n--- 🧊 Starting Parquet export ---")
+    watermarks = load_watermarks(archive_dir)
+    conn = get_db_connection()
+    try:
+        for table in ARCHIVE_TABLES:
+            try:
+                _, watermarks[table] = export_table(conn, table, archive_dir, watermarks)
+            except Exception as e:
+                conn.rollback()  # e.g. weekly_zones doesn't exist before the first sync
+                print(f"⚠️ Skipping {table}: {e}")
+        export_workouts(conn, archive_dir)
+    finally:
+        conn.close()
+    save_watermarks({k: v for k, v in watermarks.items() if v}, archive_dir)
+    print("--- Export Finished ---")
+
+
+# -----------------------------------
+# READING (DuckDB over the Parquet files, never touches the live DB)
+# -----------------------------------
+def connect_archive(archive_dir=None):
+    """
+    In-memory DuckDB connection with one view per archived table
+    (activities, weekly_zones, workouts), partition columns included.
+    """
+    import duckdb
+
+    root = _archive_dir(archive_dir)
+    con = duckdb.connect()
+    for table in list(ARCHIVE_TABLES) + ["workouts"]:
+        pattern = os.path.join(root, table, "**", "*.parquet")
+        if not os.path.isdir(os.path.join(root, table)):
+            continue
+        con.execute(f"""
+            CREATE VIEW {table} AS
+            SELECT * FROM read_parquet('{pattern}', hive_partitioning = true, union_by_name = true)
+        """)
+    return con
+
+
+def query_archive(sql, params=None, archive_dir=None):
+    """Runs an analytical query on the archive and returns a pandas DataFrame."""
+    con = connect_archive(archive_dir)
+    try:
+        return con.execute(sql, params or []).df()
+    finally:
+        con.close()
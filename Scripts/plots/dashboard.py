@@ -0,0 +1,192 @@
+import numpy as np
+
+from Scripts.plots.plots import get_engine, load_daily_running_distance
+
+# NOTE: pandas, matplotlib and SQLAlchemy are imported inside the functions (same as plots.py).
+
+# =================
+# Multi-year dashboard:
+#   1. one calendar heatmap per year (rows = weekdays, columns = weeks)
+#   2. weekly volume bars
+#   3. planned vs actual weekly km (active plan)
+# Everything starts from DAILY totals aggregated by the DB (one row per day, never
+# one per activity) and is binned with NumPy index arithmetic: a ten-year history
+# is ~3650 values, so building all the grids takes a few milliseconds.
+# =================
+
+STRAVA_ORANGE = "#FC4C02"
+
+
+# -----------------------------------
+# DATA (pre-aggregated)
+# -----------------------------------
+def load_daily_planned_distance(user_id, source: str = "db"):
+    """
+    Planned km per day of the user's ACTIVE plan: DataFrame with day, km.
+    source="archive" reads the Parquet archive (Scripts/archive.py) instead of the DB.
+    """
+    if source == "archive":
+        from Scripts.archive import query_archive
+
+        return query_archive("""
+            SELECT CAST(scheduled_date AS DATE) AS day, SUM(distance_km) AS km
+            FROM workouts
+            WHERE user_id = ? AND plan_status = 'active'
+            GROUP BY day
+            ORDER BY day;
+        """, [user_id])
+
+    import pandas as pd
+    from sqlalchemy import text
+
+    sql = text("""
+        SELECT w.scheduled_date AS day, SUM(w.distance_km) AS km
+        FROM workouts w
+        JOIN training_plans p ON p.plan_id = w.plan_id
+        WHERE p.user_id = :user_id AND p.status = 'active'
+        GROUP BY w.scheduled_date
+        ORDER BY w.scheduled_date;
+    """)
+    with get_engine().connect() as conn:
+        return pd.read_sql_query(sql, conn, params={"user_id": user_id})
+
+
+def _to_arrays(df):
+    """DataFrame(day, km) -> (datetime64[D] array, float array)."""
+    if df is None or df.empty:
+        return np.array([], dtype="datetime64[D]"), np.array([], dtype=float)
+    days = np.asarray(df["day"].astype("datetime64[ns]"), dtype="datetime64[D]")
+    return days, np.asarray(df["km"], dtype=float)
+
+
+# -----------------------------------
+# BINNING (vectorized)
+# -----------------------------------
+def weekday(days):
+    """Monday = 0 ... Sunday = 6 (1970-01-01 was a Thursday)."""
+    return (days.astype("datetime64[D]").astype(np.int64) + 3) % 7
+
+
+def calendar_grid(days, km, year):
+    """
+    7 x 54 grid of one year (row = weekday, column = week of the year).
+    Days of the year without runs are 0, cells outside the year are NaN.
+    """
+    start = np.datetime64(f"{year}-01-01", "D")
+    end = np.datetime64(f"{year + 1}-01-01", "D")
+    offset = int(weekday(np.array([start]))[0])
+
+    grid = np.full((7, 54), np.nan)
+    cell = np.arange((end - start).astype(int)) + offset
+    grid[cell % 7, cell // 7] = 0.0
+
+    in_year = (days >= start) & (days < end)
+    cell = (days[in_year] - start).astype(int) + offset
+    np.add.at(grid, (cell % 7, cell // 7), km[in_year])
+    return grid
+
+
+def weekly_totals(days, km, first_monday=None, n_weeks=None):
+    """
+    Sums daily km into Monday-based weeks with one np.bincount.
+    Returns (week_starts as datetime64[D], totals). Pass first_monday / n_weeks
+    to put several series on the same week axis.
+    """
+    if first_monday is None:
+        if len(days) == 0:
+            return np.array([], dtype="datetime64[D]"), np.array([], dtype=float)
+        first = days.min()
+        first_monday = first - np.timedelta64(int(weekday(np.array([first]))[0]), "D")
+    week = (days - first_monday).astype(int) // 7
+    keep = week >= 0
+    if n_weeks is not None:
+        keep &= week < n_weeks
+    totals = np.bincount(week[keep], weights=km[keep], minlength=n_weeks or 0)
+    week_starts = first_monday + np.arange(len(totals)) * np.timedelta64(7, "D")
+    return week_starts, totals
+
+
+# -----------------------------------
+# RENDERING
+# -----------------------------------
+def render_dashboard(daily_df, planned_df=None, years=None, save_path=None):
+    """
+    Draws the dashboard from daily totals. `years`: list of years for the heatmaps
+    (default: every year with data). Shows the figure, or saves it to save_path.
+    """
+    days, km = _to_arrays(daily_df)
+    if len(days) == 0:
+        print("No data to plot.")
+        return
+
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+
+    plan_days, plan_km = _to_arrays(planned_df)
+
+    if years is None:
+        first_year = int(str(days.min())[:4])
+        last_year = int(str(max(days.max(), plan_days.max() if len(plan_days) else days.max()))[:4])
+        years = list(range(first_year, last_year + 1))
+
+    # Common weekly axis for actual + planned
+    all_days = np.concatenate([days, plan_days])
+    first = all_days.min()
+    first_monday = first - np.timedelta64(int(weekday(np.array([first]))[0]), "D")
+    n_weeks = int((all_days.max() - first_monday).astype(int) // 7) + 1
+    week_starts, actual_weekly = weekly_totals(days, km, first_monday, n_weeks)
+    _, planned_weekly = weekly_totals(plan_days, plan_km, first_monday, n_weeks)
+
+    grids = [calendar_grid(days, km, y) for y in years]
+    vmax = max(np.nanpercentile(km, 98), 1.0)  # one long run shouldn't wash out the colors
+
+    plt.style.use("ggplot")
+    height = 1.3 * len(years) + 5
+    fig = plt.figure(figsize=(14, height), dpi=110)
+    # Fixed margins (in inches) instead of savefig(bbox_inches="tight"), which draws the whole figure twice
+    gs = fig.add_gridspec(len(years) + 1, 1, height_ratios=[1] * len(years) + [3], hspace=0.6,
+                          left=0.05, right=0.98, top=1 - 0.45 / height, bottom=0.45 / height)
+
+    cmap = plt.get_cmap("Oranges").copy()
+    cmap.set_bad("white")  # cells outside the year
+    for i, (year, grid) in enumerate(zip(years, grids)):
+        ax = fig.add_subplot(gs[i])
+        ax.imshow(np.ma.masked_invalid(grid), aspect="auto", cmap=cmap, vmin=0, vmax=vmax,
+                  interpolation="nearest")
+        ax.set_yticks([0, 2, 4, 6], ["Mon", "Wed", "Fri", "Sun"], fontsize=8)
+        ax.set_xticks([])
+        ax.grid(False)
+        total = np.nansum(grid)
+        ax.set_title(f"{year} — {total:,.0f} km", fontsize=11, loc="left")
+
+    # Weekly volume as ONE filled step artist: ax.bar would build one Rectangle per week
+    # (~520 for ten years), which alone took longer than everything else in the figure.
+    ax = fig.add_subplot(gs[-1])
+    edges = mdates.date2num(np.append(week_starts, week_starts[-1] + np.timedelta64(7, "D")))
+    ax.stairs(actual_weekly, edges, fill=True, color=STRAVA_ORANGE, alpha=0.85, label="Actual")
+    if planned_weekly.any():
+        ax.stairs(planned_weekly, edges, color="#333333", linewidth=1.8, label="Planned (active plan)")
+    ax.xaxis_date()
+    ax.set_ylabel("km / week")
+    ax.set_title("Weekly volume", fontsize=13, fontweight="bold", loc="left")
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(ax.xaxis.get_major_locator()))
+    ax.legend(loc="upper left")
+
+    if save_path:
+        fig.savefig(save_path)
+        print(f"🖼️ Dashboard saved to {save_path}")
+    else:
+        plt.show()
+
+
+def plot_dashboard(user_id, source: str = "db", years=None, save_path=None):
+    """Loads the daily aggregates (DB or Parquet archive) and renders the dashboard."""
+    daily = load_daily_running_distance(source=source)
+    planned = load_daily_planned_distance(user_id, source=source)
+    render_dashboard(daily, planned, years=years, save_path=save_path)
+
+
+# Run from the project root: python -m Scripts.plots.dashboard   (or python -m app.cli plot --dashboard)
+if __name__ == "__main__":
+    plot_dashboard("user_123")
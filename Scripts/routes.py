@@ -0,0 +1,157 @@
+# route geometry: polyline decoding, fingerprints and "same route" lookups
+import numpy as np
+
+
+# -----------------------------------
+# FINGERPRINT SETTINGS
+# -----------------------------------
+# The route is snapped to a grid of ~150 m cells: two runs on the same streets
+# touch (almost) the same set of cells, whatever the GPS noise or direction.
+CELL_DEG_LAT = 0.00135    # ~150 m
+CELL_DEG_LON = 0.0019     # ~150 m at 45° latitude (good enough for Europe)
+LON_BITS = 18             # 360 / CELL_DEG_LON < 2**18
+
+# Two activities are on the same route when Jaccard(cells_a, cells_b) >= this
+ROUTE_MATCH_JACCARD = 0.6
+
+
+def decode_polyline(encoded):
+    """
+    Decodes a Google encoded polyline (Strava's map.summary_polyline)
+    into an (n, 2) array of [lat, lon].
+    """
+    coords = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        for is_lon in (False, True):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if is_lon:
+                lon += delta
+            else:
+                lat += delta
+        coords.append((lat / 1e5, lon / 1e5))
+    return np.array(coords, dtype=float).reshape(-1, 2)
+
+
+def _densify(points, step_deg=CELL_DEG_LAT / 2):
+    """
+    summary_polyline is simplified: consecutive points can be hundreds of meters apart.
+    Adds points along every segment so no cell on the way is skipped (vectorized).
+    """
+    if len(points) < 2:
+        return points
+    seg = np.diff(points, axis=0)
+    n_sub = np.maximum(1, np.ceil(np.abs(seg).max(axis=1) / step_deg).astype(int))
+    starts = np.repeat(points[:-1], n_sub, axis=0)
+    steps = np.repeat(seg / n_sub[:, None], n_sub, axis=0)
+    # position of each sub-point inside its segment: 0, 1, ..., n_sub-1
+    offsets = np.arange(n_sub.sum()) - np.repeat(np.cumsum(n_sub) - n_sub, n_sub)
+    dense = starts + steps * offsets[:, None]
+    return np.vstack([dense, points[-1:]])
+
+
+def route_cells(points):
+    """Returns the sorted unique grid cell ids (int64) crossed by the route."""
+    if len(points) == 0:
+        return np.array([], dtype=np.int64)
+    dense = _densify(points)
+    lat_idx = np.floor((dense[:, 0] + 90.0) / CELL_DEG_LAT).astype(np.int64)
+    lon_idx = np.floor((dense[:, 1] + 180.0) / CELL_DEG_LON).astype(np.int64)
+    return np.unique((lat_idx << LON_BITS) | lon_idx)
+
+
+def route_fingerprint(encoded_polyline):
+    """
+    Compact fingerprint of one activity's route:
+      cells: sorted unique grid cells (what goes in the route_cells index)
+      start_cell / end_cell: first and last cell, to tell loops from point-to-point runs
+    Returns None when the activity has no geometry (treadmill, privacy zones, ...).
+    """
+    if not encoded_polyline:
+        return None
+    points = decode_polyline(encoded_polyline)
+    if len(points) < 2:
+        return None
+    cells = route_cells(points)
+    first, last = route_cells(points[:1]), route_cells(points[-1:])
+    return {
+        "cells": [int(c) for c in cells],
+        "start_cell": int(first[0]),
+        "end_cell": int(last[0]),
+    }
+
+
+def jaccard(shared, n_a, n_b):
+    """Jaccard similarity from the intersection size and both set sizes."""
+    union = n_a + n_b - shared
+    return shared / union if union else 0.0
+
+
+# -----------------------------------
+# QUERIES (all go through the route_cells index, never compare polylines pairwise)
+# -----------------------------------
+def find_candidate_matches(cur, cells, athlete_id, exclude_activity_id=None):
+    """
+    Returns [(activity_id, route_id, jaccard)] for activities of `athlete_id` sharing
+    at least one cell, best match first. Other athletes' runs are never candidates:
+    a match attaches the activity to the candidate's route_id.
+    Uses the (cell, activity_id) primary key of route_cells.
+    """
+    if not cells:
+        return []
+    athlete_filter = "ar.athlete_id = %s" if athlete_id is not None else "ar.athlete_id IS NULL"
+    params = (athlete_id,) if athlete_id is not None else ()
+    cur.execute(f"""
+        SELECT rc.activity_id, ar.route_id, ar.n_cells, COUNT(*) AS shared
+        FROM route_cells rc
+        JOIN activity_routes ar ON ar.activity_id = rc.activity_id AND {athlete_filter}
+        WHERE rc.cell IN %s
+        AND rc.activity_id <> %s
+        GROUP BY rc.activity_id, ar.route_id, ar.n_cells
+    """, params + (tuple(cells), exclude_activity_id if exclude_activity_id is not None else -1))
+    matches = [
+        (activity_id, route_id, jaccard(shared, len(cells), n_cells))
+        for activity_id, route_id, n_cells, shared in cur.fetchall()
+    ]
+    return sorted(matches, key=lambda m: m[2], reverse=True)
+
+
+def find_runs_on_same_route(conn, activity_id, min_similarity=ROUTE_MATCH_JACCARD):
+    """Other activities on the same route as `activity_id`: [(activity_id, similarity)], best first."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT athlete_id FROM activity_routes WHERE activity_id = %s", (activity_id,))
+        row = cur.fetchone()
+        if row is None:
+            return []
+        cur.execute("SELECT cell FROM route_cells WHERE activity_id = %s", (activity_id,))
+        cells = [r[0] for r in cur.fetchall()]
+        matches = find_candidate_matches(cur, cells, row[0], exclude_activity_id=activity_id)
+    return [(a, round(sim, 3)) for a, _, sim in matches if sim >= min_similarity]
+
+
+def route_pace_trend(conn, route_id):
+    """
+    Pace over time on one route: [(start_date_local, distance_m, moving_time_s, pace_min_per_km)].
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT a.start_date_local, a.distance_m, a.moving_time_s, a.average_speed_mps
+            FROM activity_routes ar
+            JOIN activities a ON a.strava_id = ar.activity_id
+            WHERE ar.route_id = %s
+            ORDER BY a.start_date_local
+        """, (route_id,))
+        rows = cur.fetchall()
+    return [
+        (day, dist, mov, round(1000 / speed / 60, 2) if speed else None)
+        for day, dist, mov, speed in rows
+    ]
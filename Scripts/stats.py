@@ -1 +1,91 @@
-# pure calculations / aggregations
\ No newline at end of file
+# pure calculations / aggregations
+import numpy as np
+
+
+# -----------------------------------
+# BEST EFFORTS (fastest segment of a given distance inside one activity)
+# -----------------------------------
+
+# Standard distances we index, in meters (400 m -> marathon)
+BEST_EFFORT_DISTANCES_M = (400, 800, 1000, 1609, 3000, 5000, 10000, 15000, 21097, 42195)
+
+
+def best_efforts_from_stream(distance, time, targets=BEST_EFFORT_DISTANCES_M):
+    """
+    Finds the fastest effort for each target distance inside ONE activity.
+
+    distance, time: the Strava 'distance' (m) and 'time' (s) streams, same length.
+
+    Returns a dict {target_m: (elapsed_s, start_offset_s)} only for the targets the
+    activity is long enough to cover.
+
+    Vectorized sliding window: for every start sample i, np.searchsorted finds the
+    first sample j where distance[j] - distance[i] >= target, so each target costs
+    one O(n log n) pass instead of an O(n^2) double loop.
+    """
+    d = np.asarray(distance, dtype=float)
+    t = np.asarray(time, dtype=float)
+    if len(d) < 2 or len(d) != len(t):
+        return {}
+
+    # GPS glitches can make the distance stream dip: searchsorted needs it sorted
+    d = np.maximum.accumulate(d)
+
+    efforts = {}
+    for target in targets:
+        if d[-1] - d[0] < target:
+            continue
+
+        j = np.searchsorted(d, d + target, side="left")
+        i = np.nonzero(j < len(d))[0]
+        j = j[i]
+
+        # Interpolate the exact crossing time between samples j-1 and j,
+        # otherwise low sampling rates make every effort look a bit slower.
+        seg = d[j] - d[j - 1]
+        overshoot = d[j] - (d[i] + target)
+        frac = np.divide(overshoot, seg, out=np.zeros_like(seg), where=seg > 0)
+        end_t = t[j] - frac * (t[j] - t[j - 1])
+        elapsed = end_t - t[i]
+
+        k = int(np.argmin(elapsed))
+        efforts[target] = (float(elapsed[k]), float(t[i[k]] - t[0]))
+
+    return efforts
+
+
+# -----------------------------------
+# INTENSITY ZONES (time spent in HR / pace zones)
+# -----------------------------------
+
+# Lower bound of each zone (Z1..Z5). Used when the athlete has no row in athlete_zones.
+DEFAULT_ZONES = {
+    "hr": (0, 125, 145, 160, 175),           # bpm
+    "pace": (0.0, 2.8, 3.2, 3.6, 4.1),       # m/s (~6:00, 5:12, 4:38, 4:04 min/km)
+}
+
+# A gap between two samples longer than this is a pause (auto-pause, traffic light...)
+MAX_SAMPLE_GAP_S = 30
+
+
+def seconds_in_zones(values, time, lower_bounds, max_gap_s=MAX_SAMPLE_GAP_S):
+    """
+    Bins a stream (heartrate or velocity) into zones, weighted by sample duration.
+
+    Each sample "owns" the time until the next one. A gap longer than max_gap_s is a
+    pause and counts 0 s, so pauses don't count. Returns a list with the seconds spent in each zone, len == len(lower_bounds).
+    Fully vectorized: searchsorted for the zone index + bincount for the weighted histogram.
+    """
+    v = np.asarray(values, dtype=float)
+    t = np.asarray(time, dtype=float)
+    n_zones = len(lower_bounds)
+    if len(v) < 2 or len(v) != len(t):
+        return [0.0] * n_zones
+
+    dt = np.clip(np.diff(t, append=t[-1]), 0, None)
+    dt[dt > max_gap_s] = 0.0  # pause: drop it entirely (capping would still count max_gap_s)
+    zone = np.searchsorted(np.asarray(lower_bounds, dtype=float), v, side="right") - 1
+    keep = ~np.isnan(v) & (zone >= 0)
+
+    totals = np.bincount(zone[keep], weights=dt[keep], minlength=n_zones)
+    return [float(x) for x in totals[:n_zones]]
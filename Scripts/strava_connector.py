@@ -1,12 +1,19 @@
-import os, json, time
+import os, json, re, time
+from itertools import islice
 from pathlib import Path
-from flask import Flask, request
 from dotenv import load_dotenv
-from stravalib import Client
-import requests
-import psycopg2
 import datetime
 
+# NOTE: flask, stravalib, requests and psycopg2 are imported inside the functions
+# that need them, so a cron `sync` never pays for Flask and `import` stays cheap.
+
+# orjson is optional: several times faster than json on big activity pages
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 load_dotenv()
 
 CLIENT_ID = int(os.getenv("STRAVA_CLIENT_ID"))
@@ -17,8 +24,6 @@ SCOPES = os.getenv("STRAVA_SCOPES", "read").split(",")
 TOKENS_PATH = Path("strava_tokens.json")
 API_BASE = "https://www.strava.com/api/v3"
 
-app = Flask(__name__) #Creates the Flask app instance
-
 # =================================================
 # TOKENS
 # =================================================
@@ -39,6 +44,8 @@ def load_tokens():
 # (since it knows your refresh token and expiry).
 #===================================
 def make_client():
+    from stravalib import Client
+
     t = load_tokens() or {}
     return Client(
         access_token=t.get("access_token"),
@@ -49,34 +56,43 @@ def make_client():
 # =================================================
 # FLASK ROUTES (Only used for initial OAuth authorization)
 # =================================================
-@app.route("/")
-def index():
-    url = Client().authorization_url(
-        client_id=CLIENT_ID, redirect_uri=REDIRECT_URI, scope=SCOPES
-    )
-    return f"""
-            <html>
-            <body style="font-family:sans-serif">
-                <h3>Strava OAuth</h3>
-                <p><a href="{url}"><button>Connect Strava</button></a></p>
-            </body>
-            </html>
-            """
-
-#=====================
-# Part the receive strava response
-#=====================
-@app.route("/callback")
-def callback():
-    if request.args.get("error"):
-        return f"Error: {request.args['error']}", 400
-    code = request.args.get("code") #Extracts the temporary authorization code from the URL.
-    c = Client()
-    token = c.exchange_code_for_token(
-        client_id=CLIENT_ID, client_secret=CLIENT_SECRET, code=code
-    )
-    save_tokens(token)
-    return "<h3>Authorized!</h3><p>You can close this tab and re-run the script.</p>"
+def create_oauth_app():
+    """Builds the Flask app with the OAuth routes (only needed once, to get tokens)."""
+    from flask import Flask, request
+    from stravalib import Client
+
+    app = Flask(__name__) #Creates the Flask app instance
+
+    @app.route("/")
+    def index():
+        url = Client().authorization_url(
+            client_id=CLIENT_ID, redirect_uri=REDIRECT_URI, scope=SCOPES
+        )
+        return f"""
+                <html>
+                <body style="font-family:sans-serif">
+                    <h3>Strava OAuth</h3>
+                    <p><a href="{url}"><button>Connect Strava</button></a></p>
+                </body>
+                </html>
+                """
+
+    #=====================
+    # Part the receive strava response
+    #=====================
+    @app.route("/callback")
+    def callback():
+        if request.args.get("error"):
+            return f"Error: {request.args['error']}", 400
+        code = request.args.get("code") #Extracts the temporary authorization code from the URL.
+        c = Client()
+        token = c.exchange_code_for_token(
+            client_id=CLIENT_ID, client_secret=CLIENT_SECRET, code=code
+        )
+        save_tokens(token)
+        return "<h3>Authorized!</h3><p>You can close this tab and re-run the script.</p>"
+
+    return app
 
 
 #==================
@@ -85,6 +101,8 @@ def callback():
 #==================
 def raw_get(path, params=None):
     """Direct REST call to see the exact JSON Strava returns."""
+    import requests
+
     t = load_tokens()
     if not t: raise RuntimeError("No tokens yet.")
     headers = {"Authorization": f"Bearer {t['access_token']}"} #This is how API requests prove your identity.
@@ -93,6 +111,8 @@ def raw_get(path, params=None):
     if r.status_code == 401:
         print('Token expired, refreshing...')
         # Refresh the token using stravalib
+        from stravalib import Client
+
         c = Client()
         refreshed_token = c.refresh_access_token(
             client_id=CLIENT_ID,
@@ -106,7 +126,121 @@ def raw_get(path, params=None):
         r = requests.get(f"{API_BASE}{path}", headers=headers, params=params or {}, timeout=30)
 
     r.raise_for_status()
-    return r.json(), r
+    return _json_loads(r.content), r
+
+#=================================================
+# ACTIVITY LISTING (backfills)
+#=================================================
+
+MAX_PER_PAGE = 200        # Strava's maximum for /athlete/activities
+RATE_LIMIT_MARGIN = 10    # keep a few requests of the 15-min window for the rest of the sync
+
+
+def _remaining_short_term_requests(response):
+    """
+    Requests left in the current 15-min window, from Strava's rate limit headers
+    ("X-ReadRateLimit-*" for read endpoints, falling back to the overall "X-RateLimit-*").
+    None when the headers are missing.
+    """
+    for prefix in ("X-ReadRateLimit", "X-RateLimit"):
+        limit = response.headers.get(f"{prefix}-Limit")
+        usage = response.headers.get(f"{prefix}-Usage")
+        if limit and usage:
+            return int(limit.split(",")[0]) - int(usage.split(",")[0])
+    return None
+
+
+def _rate_limit_reached(response):
+    """
+    True when the 15-min window is down to RATE_LIMIT_MARGIN requests. The per-activity
+    passes (streams, details) stop there instead of sleeping: they resume next sync.
+    """
+    remaining = _remaining_short_term_requests(response)
+    return remaining is not None and remaining <= RATE_LIMIT_MARGIN
+
+
+def _is_rate_limit_error(e):
+    """True for the HTTPError raise_for_status gives on a 429 Too Many Requests."""
+    return getattr(getattr(e, "response", None), "status_code", None) == 429
+
+
+def _wait_for_next_rate_window():
+    """Strava's short-term limit resets at 0, 15, 30 and 45 minutes past the hour."""
+    now = time.time()
+    wait_s = 900 - (now % 900) + 1
+    print(f"⏳ Rate limit almost used up, sleeping {wait_s:.0f}s until the next window...")
+    time.sleep(wait_s)
+
+
+def iter_activity_pages(per_page=MAX_PER_PAGE, max_workers=4, after=None, before=None):
+    """
+    Yields pages (lists of raw activity dicts) of /athlete/activities
+    (newest first, or oldest first when `after` is given: that's how Strava sorts).
+
+    Page 1 is fetched alone (it refreshes the token if needed and tells us the rate
+    budget), then up to `max_workers` pages are in flight at the same time. Pages are
+    yielded in order and at most `max_workers` pages are held in memory.
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+
+    base = {"per_page": per_page}
+    if after is not None:
+        base["after"] = int(after)
+    if before is not None:
+        base["before"] = int(before)
+
+    def fetch(page):
+        return raw_get("/athlete/activities", params={**base, "page": page})
+
+    first, response = fetch(1)
+    yield first
+    if len(first) < per_page:
+        return
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = deque()
+    next_page = 2
+    workers = max_workers
+    try:
+        while True:
+            while len(in_flight) < workers:
+                in_flight.append(pool.submit(fetch, next_page))
+                next_page += 1
+
+            page, response = in_flight.popleft().result()
+            yield page
+            if len(page) < per_page:
+                return  # last page: whatever is still in flight is past the end
+
+            remaining = _remaining_short_term_requests(response)
+            if remaining is not None:
+                budget = remaining - RATE_LIMIT_MARGIN - len(in_flight)
+                if budget <= 0 and not in_flight:
+                    _wait_for_next_rate_window()
+                    budget = max_workers
+                workers = max(0, min(max_workers, budget))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_activities(per_page=MAX_PER_PAGE, max_workers=4, after=None, before=None):
+    """Streams raw activity dicts one by one (see iter_activity_pages)."""
+    for page in iter_activity_pages(per_page, max_workers, after, before):
+        yield from page
+
+
+def chunked(iterable, size):
+    """Groups an iterable into lists of `size` items (the last one can be shorter)."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
 #=================================================
 # DATABASE 
@@ -114,15 +248,20 @@ def raw_get(path, params=None):
 
 
 def get_db_connection():
-    """Establishes and returns a connection to the PostgreSQL database."""
-    conn = psycopg2.connect(
-        database=os.getenv("POSTGRES_DB"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_PASSWORD"),
-        host=os.getenv("POSTGRES_HOST"),
-        port=os.getenv("POSTGRES_PORT")
-    )
-    return conn
+    """
+    Establishes and returns a connection to the configured DB
+    (Postgres or embedded SQLite, see Config.DB_BACKEND in app/config.py).
+    """
+    from app.utils.database import get_db_connection as _connect
+
+    return _connect()
+
+
+def _bulk_insert(cur, sql, rows):
+    """Multi-row INSERT: one round trip per page of rows instead of one per row."""
+    from app.utils.database import bulk_insert
+
+    bulk_insert(cur, sql, rows)
 
 
 def create_activities_table(conn):
@@ -131,6 +270,7 @@ def create_activities_table(conn):
         cur.execute(    """
             CREATE TABLE IF NOT EXISTS activities (
                 strava_id BIGINT PRIMARY KEY,
+                athlete_id BIGINT,
 
                 -- 📌 1. Informazioni generali
                 name VARCHAR(255),
@@ -165,228 +305,935 @@ def create_activities_table(conn):
                 calories REAL,
                 average_temp REAL,
                 max_temperature REAL,
-                suffer_score REAL
+                suffer_score REAL,
+
+                -- 📌 7. Stato elaborazione streams (best efforts, ...) e dettagli (splits, laps, segments)
+                streams_scanned_at TIMESTAMP,
+                details_fetched_at TIMESTAMP,
+
+                -- 📌 8. Change detection (hash of the values above, see insert_activity_rows)
+                payload_hash VARCHAR(32),
+                updated_at TIMESTAMP
             );
         """)
+        # Tables created before these columns existed
+        cur.execute("ALTER TABLE activities ADD COLUMN IF NOT EXISTS athlete_id BIGINT;")
+        cur.execute("ALTER TABLE activities ADD COLUMN IF NOT EXISTS streams_scanned_at TIMESTAMP;")
+        cur.execute("ALTER TABLE activities ADD COLUMN IF NOT EXISTS details_fetched_at TIMESTAMP;")
+        cur.execute("ALTER TABLE activities ADD COLUMN IF NOT EXISTS payload_hash VARCHAR(32);")
+        cur.execute("ALTER TABLE activities ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;")
     conn.commit()
     
     
 
-def insert_one_activity(conn, act):
+# Note: "ON CONFLICT DO UPDATE" so if you re-run it,
+# it updates the name/distance if they changed, rather than crashing.
+# The WHERE on payload_hash turns a re-fetched but unchanged activity into a no-op
+# (no dead tuple, no WAL), even if it slips past the check in insert_activity_rows.
+# Used with execute_values: "VALUES %s" expands to one (...) per row.
+UPSERT_ACTIVITY_SQL = """
+    INSERT INTO activities (
+        strava_id,
+        athlete_id,
+        name,
+        activity_description,
+        type,
+        sport_type,
+        workout_type,
+        timezone,
+        start_date_local,
+        distance_m,
+        moving_time_s,
+        elapsed_time_s,
+        elevation_gain_m,
+        elev_high_m,
+        elev_low_m,
+        average_speed_mps,
+        max_speed_mps,
+        average_cadence,
+        has_heartrate,
+        average_heartrate,
+        max_heartrate,
+        heartrate_opt_out,
+        display_hide_heartrate_option,
+        calories,
+        average_temp,
+        max_temperature,
+        suffer_score,
+        payload_hash,
+        updated_at
+    ) VALUES %s
+    ON CONFLICT (strava_id) DO UPDATE SET
+        athlete_id                    = EXCLUDED.athlete_id,
+        name                          = EXCLUDED.name,
+        activity_description          = EXCLUDED.activity_description,
+        type                          = EXCLUDED.type,
+        sport_type                    = EXCLUDED.sport_type,
+        workout_type                  = EXCLUDED.workout_type,
+        timezone                      = EXCLUDED.timezone,
+        start_date_local              = EXCLUDED.start_date_local,
+        distance_m                    = EXCLUDED.distance_m,
+        moving_time_s                 = EXCLUDED.moving_time_s,
+        elapsed_time_s                = EXCLUDED.elapsed_time_s,
+        elevation_gain_m              = EXCLUDED.elevation_gain_m,
+        elev_high_m                   = EXCLUDED.elev_high_m,
+        elev_low_m                    = EXCLUDED.elev_low_m,
+        average_speed_mps             = EXCLUDED.average_speed_mps,
+        max_speed_mps                 = EXCLUDED.max_speed_mps,
+        average_cadence               = EXCLUDED.average_cadence,
+        has_heartrate                 = EXCLUDED.has_heartrate,
+        average_heartrate             = EXCLUDED.average_heartrate,
+        max_heartrate                 = EXCLUDED.max_heartrate,
+        heartrate_opt_out             = EXCLUDED.heartrate_opt_out,
+        display_hide_heartrate_option = EXCLUDED.display_hide_heartrate_option,
+        calories                      = EXCLUDED.calories,
+        average_temp                  = EXCLUDED.average_temp,
+        max_temperature               = EXCLUDED.max_temperature,
+        suffer_score                  = EXCLUDED.suffer_score,
+        payload_hash                  = EXCLUDED.payload_hash,
+        updated_at                    = EXCLUDED.updated_at
+    WHERE activities.payload_hash IS DISTINCT FROM EXCLUDED.payload_hash;
+"""
+
+
+# -----------------------------------
+# RAW JSON -> ROW (no stravalib models)
+# -----------------------------------
+# Building a stravalib model per activity (full pydantic validation) and then reading
+# it back attribute by attribute is the top CPU cost of a backfill. Both sync and backfill
+# map the raw JSON dicts from raw_get straight to the UPSERT_ACTIVITY_SQL tuple: ONE mapper,
+# so the same activity always gives the same row (and the same payload_hash).
+
+def _float_or_zero(v):
+    return float(v) if v else 0.0
+
+
+def _float_or_none(v):
+    return float(v) if v else None
+
+
+def _real(v):
+    # REAL columns where 0 is a real value (unlike _float_or_none): only None stays None
+    return float(v) if v is not None else None
+
+
+def _int_or_none(v):
+    return int(v) if v is not None else None
+
+
+def _int_or_zero(v):
+    return int(v) if v else 0
+
+
+def _description(v):
+    return str(v) if v else "No description"
+
+
+def _naive_timestamp(v):
+    # "2025-03-01T07:30:00Z" -> datetime without timezone (TIMESTAMP "naive" in the DB)
+    return datetime.datetime.fromisoformat(v[:19]) if v else None
+
+
+# (column, JSON key or (key, subkey), converter) — SAME ORDER as UPSERT_ACTIVITY_SQL
+# (payload_hash / updated_at are appended by with_payload_hash)
+RAW_ACTIVITY_FIELDS = (
+    ("strava_id",                     "id",                            None),
+    ("athlete_id",                    ("athlete", "id"),               None),
+    ("name",                          "name",                          None),
+    ("activity_description",          "description",                   _description),
+    ("type",                          "type",                          None),
+    ("sport_type",                    "sport_type",                    None),
+    ("workout_type",                  "workout_type",                  _int_or_none),
+    ("timezone",                      "timezone",                      None),
+    ("start_date_local",              "start_date_local",              _naive_timestamp),
+    ("distance_m",                    "distance",                      _float_or_zero),
+    ("moving_time_s",                 "moving_time",                   _int_or_zero),
+    ("elapsed_time_s",                "elapsed_time",                  _int_or_zero),
+    ("elevation_gain_m",              "total_elevation_gain",          _float_or_zero),
+    ("elev_high_m",                   "elev_high",                     _float_or_none),
+    ("elev_low_m",                    "elev_low",                      _float_or_none),
+    ("average_speed_mps",             "average_speed",                 _float_or_none),
+    ("max_speed_mps",                 "max_speed",                     _float_or_none),
+    ("average_cadence",               "average_cadence",               _float_or_none),
+    ("has_heartrate",                 "has_heartrate",                 None),
+    ("average_heartrate",             "average_heartrate",             _real),
+    ("max_heartrate",                 "max_heartrate",                 _real),
+    ("heartrate_opt_out",             "heartrate_opt_out",             None),
+    ("display_hide_heartrate_option", "display_hide_heartrate_option", None),
+    ("calories",                      "calories",                      _real),
+    ("average_temp",                  "average_temp",                  _real),
+    ("max_temperature",               "max_temperature",               _real),
+    ("suffer_score",                  "suffer_score",                  _real),
+)
+
+
+def _compile_row_mapper(fields):
     """
-    Parses and inserts a single Strava activity into the DB.
-    Commits immediately for granular control.
+    Turns the declarative spec into one getter per column, ONCE at import.
+    Mapping an activity is then just a tuple of dict lookups, no per-row spec parsing.
     """
-    try:
-        # ---------- 1) Informazioni generali ----------
-        act_type = str(act.type) if getattr(act, "type", None) else None
-        sport_type = str(act.sport_type) if getattr(act, "sport_type", None) else None
-        workout_type = getattr(act, "workout_type", None)
-        timezone = getattr(act, "timezone", None)
-
-        description = (
-            str(act.description) if getattr(act, "description", None) else "No description"
-        )
-
-        # start_date_local senza timezone (per TIMESTAMP "naive" in Postgres)
-        if getattr(act, "start_date_local", None):
-            start_date = act.start_date_local.replace(tzinfo=None)
+    getters = []
+    for _, key, convert in fields:
+        if isinstance(key, tuple):
+            outer, inner = key
+            get = lambda d, o=outer, i=inner: (d.get(o) or {}).get(i)
         else:
-            start_date = None
-
-        # ---------- 2) Durate e distanze ----------
-        # stravalib spesso usa oggetti Quantity; cast a float in metri
-        dist = float(act.distance) if getattr(act, "distance", None) else 0.0
-        elev_gain = (
-            float(act.total_elevation_gain)
-            if getattr(act, "total_elevation_gain", None)
-            else 0.0
-        )
-        elev_high = float(act.elev_high) if getattr(act, "elev_high", None) else None
-        elev_low = float(act.elev_low) if getattr(act, "elev_low", None) else None
+            get = lambda d, k=key: d.get(k)
+        if convert is not None:
+            get = lambda d, g=get, c=convert: c(g(d))
+        getters.append(get)
+    getters = tuple(getters)
 
-        # moving_time / elapsed_time sono timedelta → convertiamo in secondi
-        mov_time = (
-            act.moving_time if getattr(act, "moving_time", None) else 0
-        )
-        ela_time = (
-            act.elapsed_time if getattr(act, "elapsed_time", None) else 0
-        )
+    def mapper(raw):
+        return tuple([get(raw) for get in getters])
 
-        # ---------- 4) Velocità, potenza, cadenza ----------
-        avg_spd = (
-            float(act.average_speed)
-            if getattr(act, "average_speed", None)
-            else None
-        )
-        max_spd = float(act.max_speed) if getattr(act, "max_speed", None) else None
-        avg_cad = (
-            float(act.average_cadence)
-            if getattr(act, "average_cadence", None)
-            else None
-        )
+    return mapper
 
-        # ---------- 5) Frequenza cardiaca ----------
-        has_hr = getattr(act, "has_heartrate", None)
-        avg_hr = getattr(act, "average_heartrate", None)
-        max_hr = getattr(act, "max_heartrate", None)
-        hr_opt_out = getattr(act, "heartrate_opt_out", None)
-        hide_hr_opt = getattr(act, "display_hide_heartrate_option", None)
-
-        # ---------- 6) Calorie & Parametri fisiologici ----------
-        calories = getattr(act, "calories", None)
-        avg_temp = getattr(act, "average_temp", None)
-        max_temp = getattr(act, "max_temperature", None)
-        suffer_score = getattr(act, "suffer_score", None)
-
-        data = (
-            act.id,           # strava_id
-            act.name,         # name
-            description,      # activity_description
-            act_type,         # type
-            sport_type,       # sport_type
-            workout_type,     # workout_type
-            timezone,         # timezone
-            start_date,       # start_date_local
-
-            dist,             # distance_m
-            mov_time,         # moving_time_s
-            ela_time,         # elapsed_time_s
-            elev_gain,        # elevation_gain_m
-            elev_high,        # elev_high_m
-            elev_low,         # elev_low_m
-
-            avg_spd,          # average_speed_mps
-            max_spd,          # max_speed_mps
-            avg_cad,          # average_cadence
-
-            has_hr,           # has_heartrate
-            avg_hr,           # average_heartrate
-            max_hr,           # max_heartrate
-            hr_opt_out,       # heartrate_opt_out
-            hide_hr_opt,      # display_hide_heartrate_option
-
-            calories,         # calories
-            avg_temp,         # average_temp
-            max_temp,         # max_temperature
-            suffer_score      # suffer_score
-        )
 
-        # 2. Insert
+def _upsert_columns(sql):
+    return [c.strip() for c in re.search(r"INSERT INTO activities \((.*?)\)", sql, re.S).group(1).split(",")]
+
+
+# A column added to the SQL but not to the spec would silently shift every value
+assert [f[0] for f in RAW_ACTIVITY_FIELDS] + ["payload_hash", "updated_at"] == _upsert_columns(UPSERT_ACTIVITY_SQL)
+
+raw_activity_row = _compile_row_mapper(RAW_ACTIVITY_FIELDS)
+raw_activity_row.__doc__ = "Maps one raw Strava activity dict (from raw_get) to an activity tuple."
+
+
+# -----------------------------------
+# CHANGE DETECTION
+# -----------------------------------
+def _canonical(v):
+    # Numbers compare by value (170 == 170.0), everything else by its string form
+    if isinstance(v, bool) or v is None:
+        return v
+    if isinstance(v, (int, float)):
+        return float(v)
+    return str(v)
+
+
+def payload_hash(row):
+    """
+    Stable 128-bit hash of an activity tuple: same values -> same hash.
+    Hashes a canonical JSON serialization (not repr), so the Python types a mapper
+    happens to produce can't make an unchanged activity look "updated".
+    """
+    import hashlib
+
+    payload = json.dumps([_canonical(v) for v in row], separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def with_payload_hash(row, now=None):
+    """Appends payload_hash and updated_at, the last two columns of UPSERT_ACTIVITY_SQL."""
+    return row + (payload_hash(row), now or datetime.datetime.now())
+
+
+def insert_activity_rows(conn, rows):
+    """
+    Bulk upsert of many activity rows (tuples from raw_activity_row):
+    multi-row statements and ONE commit. This is what syncs and backfills use.
+
+    Rows whose payload_hash matches the stored one are not written at all: re-fetching
+    the same recent activities every sync no longer rewrites them (dead tuples, WAL).
+    Returns {"inserted": n, "updated": n, "unchanged": n}.
+    """
+    # The same activity twice in one statement makes ON CONFLICT fail: keep the last one
+    unique = {row[0]: row for row in rows}
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not unique:
+        return counts
+
+    now = datetime.datetime.now()
+    try:
         with conn.cursor() as cur:
             cur.execute(
-                """
-                INSERT INTO activities (
-                    strava_id,
-                    name,
-                    activity_description,
-                    type,
-                    sport_type,
-                    workout_type,
-                    timezone,
-                    start_date_local,
-                    distance_m,
-                    moving_time_s,
-                    elapsed_time_s,
-                    elevation_gain_m,
-                    elev_high_m,
-                    elev_low_m,
-                    average_speed_mps,
-                    max_speed_mps,
-                    average_cadence,
-                    has_heartrate,
-                    average_heartrate,
-                    max_heartrate,
-                    heartrate_opt_out,
-                    display_hide_heartrate_option,
-                    calories,
-                    average_temp,
-                    max_temperature,
-                    suffer_score
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s
-                )
-                ON CONFLICT (strava_id) DO UPDATE SET
-                    name                         = EXCLUDED.name,
-                    activity_description          = EXCLUDED.activity_description,
-                    type                          = EXCLUDED.type,
-                    sport_type                    = EXCLUDED.sport_type,
-                    workout_type                  = EXCLUDED.workout_type,
-                    timezone                      = EXCLUDED.timezone,
-                    start_date_local              = EXCLUDED.start_date_local,
-                    distance_m                    = EXCLUDED.distance_m,
-                    moving_time_s                 = EXCLUDED.moving_time_s,
-                    elapsed_time_s                = EXCLUDED.elapsed_time_s,
-                    elevation_gain_m              = EXCLUDED.elevation_gain_m,
-                    elev_high_m                   = EXCLUDED.elev_high_m,
-                    elev_low_m                    = EXCLUDED.elev_low_m,
-                    average_speed_mps             = EXCLUDED.average_speed_mps,
-                    max_speed_mps                 = EXCLUDED.max_speed_mps,
-                    average_cadence               = EXCLUDED.average_cadence,
-                    has_heartrate                 = EXCLUDED.has_heartrate,
-                    average_heartrate             = EXCLUDED.average_heartrate,
-                    max_heartrate                 = EXCLUDED.max_heartrate,
-                    heartrate_opt_out             = EXCLUDED.heartrate_opt_out,
-                    display_hide_heartrate_option = EXCLUDED.display_hide_heartrate_option,
-                    calories                      = EXCLUDED.calories,
-                    average_temp                  = EXCLUDED.average_temp,
-                    max_temperature               = EXCLUDED.max_temperature,
-                    suffer_score                  = EXCLUDED.suffer_score;
-                """,
-                data,)
-            # Note: I added "ON CONFLICT DO UPDATE" so if you re-run it, 
-            # it updates the name/distance if they changed, rather than crashing.
+                "SELECT strava_id, payload_hash FROM activities WHERE strava_id IN %s",
+                (tuple(unique),),
+            )
+            stored = dict(cur.fetchall())
+
+            to_write = []
+            for strava_id, row in unique.items():
+                hashed = with_payload_hash(row, now)
+                if strava_id not in stored:
+                    counts["inserted"] += 1
+                elif stored[strava_id] != hashed[-2]:
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+                    continue
+                to_write.append(hashed)
 
+            _bulk_insert(cur, UPSERT_ACTIVITY_SQL, to_write)
         conn.commit()
-        print(f"✅ Saved: {act.name} ({act.id})")
+        return counts
+    except Exception:
+        conn.rollback()
+        raise
+
+
 
+
+#=================================================
+# STREAMS (computed ONCE per activity at ingestion)
+#=================================================
+
+def create_best_efforts_table(conn):
+    """Fastest effort per standard distance and activity (see Scripts/stats.py)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS best_efforts (
+                activity_id BIGINT NOT NULL,
+                athlete_id BIGINT,
+                distance_m INTEGER NOT NULL,
+                start_date_local TIMESTAMP,
+                elapsed_s REAL NOT NULL,
+                start_offset_s REAL,
+                PRIMARY KEY (activity_id, distance_m)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_best_efforts_athlete_dist_date
+            ON best_efforts (athlete_id, distance_m, start_date_local);
+        """)
+        # Used by get_runner_stats, which doesn't know the strava athlete id yet
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_best_efforts_dist_date
+            ON best_efforts (distance_m, start_date_local);
+        """)
+    conn.commit()
+
+
+def create_zone_tables(conn):
+    """
+    athlete_zones: per-athlete zone thresholds (lower bound of each zone).
+    activity_zones: seconds spent in each zone, per activity.
+    weekly_zones: the same rolled up per (athlete, week), what agents and charts read.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS athlete_zones (
+                athlete_id BIGINT NOT NULL,
+                zone_type VARCHAR(10) NOT NULL,      -- 'hr' (bpm) | 'pace' (m/s)
+                zone_index INTEGER NOT NULL,         -- 0 = Z1
+                lower_bound REAL NOT NULL,
+                PRIMARY KEY (athlete_id, zone_type, zone_index)
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS activity_zones (
+                activity_id BIGINT NOT NULL,
+                athlete_id BIGINT,
+                start_date_local TIMESTAMP,
+                zone_type VARCHAR(10) NOT NULL,
+                zone_index INTEGER NOT NULL,
+                seconds REAL NOT NULL,
+                PRIMARY KEY (activity_id, zone_type, zone_index)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_activity_zones_athlete_date
+            ON activity_zones (athlete_id, start_date_local);
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS weekly_zones (
+                athlete_id BIGINT NOT NULL,
+                week_start DATE NOT NULL,
+                zone_type VARCHAR(10) NOT NULL,
+                zone_index INTEGER NOT NULL,
+                seconds REAL NOT NULL,
+                updated_at TIMESTAMP,                -- export watermark (Scripts/archive.py)
+                PRIMARY KEY (athlete_id, week_start, zone_type, zone_index)
+            );
+        """)
+        cur.execute("ALTER TABLE weekly_zones ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_weekly_zones_week
+            ON weekly_zones (week_start);
+        """)
+    conn.commit()
+
+
+def sync_hr_zones(conn, athlete_id):
+    """
+    Copies the athlete's HR zones from Strava (/athlete/zones) into athlete_zones.
+    Needs the profile:read_all scope; without it we just keep the defaults.
+    Pace zones are not exposed by the API: insert rows by hand to override the defaults.
+    """
+    try:
+        data, _ = raw_get("/athlete/zones")
+        zones = (data.get("heart_rate") or {}).get("zones") or []
     except Exception as e:
-        conn.rollback() #undo all changes since last commit 
-        print(f"❌ Failed to save {act.id}: {e}")
+        print(f"⚠️ Could not fetch HR zones, using defaults: {e}")
+        return
+
+    rows = [(athlete_id, "hr", i, z.get("min", 0)) for i, z in enumerate(zones)]
+    if not rows:
+        return
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM athlete_zones WHERE athlete_id = %s AND zone_type = 'hr'", (athlete_id,))
+        _bulk_insert(cur, """
+            INSERT INTO athlete_zones (athlete_id, zone_type, zone_index, lower_bound)
+            VALUES %s
+        """, rows)
+    conn.commit()
 
 
+def load_athlete_zones(conn, athlete_id):
+    """Returns {zone_type: lower_bounds} for the athlete, falling back to DEFAULT_ZONES."""
+    from Scripts.stats import DEFAULT_ZONES
+
+    zones = dict(DEFAULT_ZONES)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT zone_type, lower_bound
+            FROM athlete_zones
+            WHERE athlete_id = %s
+            ORDER BY zone_type, zone_index;
+        """, (athlete_id,))
+        custom = {}
+        for zone_type, lower_bound in cur.fetchall():
+            custom.setdefault(zone_type, []).append(lower_bound)
+    zones.update({k: tuple(v) for k, v in custom.items()})
+    return zones
 
 
+# Every stream-derived table is computed from this single fetch
+STREAM_KEYS = ("distance", "time", "heartrate", "velocity_smooth")
+
+
+def fetch_streams(activity_id, keys=STREAM_KEYS):
+    """
+    Returns ({key: [values...]}, response) for the requested streams of one activity.
+    Missing streams (e.g. no GPS on a treadmill run) are simply absent.
+    The response carries the rate limit headers (see _rate_limit_reached).
+    """
+    data, response = raw_get(
+        f"/activities/{activity_id}/streams",
+        params={"keys": ",".join(keys), "key_by_type": "true"},
+    )
+    return {k: v["data"] for k, v in data.items() if isinstance(v, dict) and "data" in v}, response
+
+
+def best_effort_rows(activity_id, athlete_id, start_date, streams):
+    """Turns one activity's streams into best_efforts rows."""
+    from Scripts.stats import best_efforts_from_stream
+
+    if "distance" not in streams or "time" not in streams:
+        return []
+    efforts = best_efforts_from_stream(streams["distance"], streams["time"])
+    return [
+        (activity_id, athlete_id, dist_m, start_date, elapsed_s, offset_s)
+        for dist_m, (elapsed_s, offset_s) in efforts.items()
+    ]
+
+
+def zone_rows(activity_id, athlete_id, start_date, streams, zones):
+    """Turns one activity's streams into activity_zones rows (HR and pace)."""
+    from Scripts.stats import seconds_in_zones
+
+    if "time" not in streams:
+        return []
+    rows = []
+    for zone_type, stream_key in (("hr", "heartrate"), ("pace", "velocity_smooth")):
+        if stream_key not in streams:
+            continue
+        seconds = seconds_in_zones(streams[stream_key], streams["time"], zones[zone_type])
+        rows += [
+            (activity_id, athlete_id, start_date, zone_type, i, sec)
+            for i, sec in enumerate(seconds)
+        ]
+    return rows
+
+
+def rollup_weekly_zones(conn, athlete_id, since):
+    """Recomputes weekly_zones for every week from `since` onwards (only the touched weeks)."""
+    # Monday 00:00 of the week of `since`
+    week_start = datetime.datetime.combine(since.date() - datetime.timedelta(days=since.weekday()),
+                                           datetime.time())
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO weekly_zones (athlete_id, week_start, zone_type, zone_index, seconds, updated_at)
+            SELECT athlete_id, DATE_TRUNC('week', start_date_local)::date, zone_type, zone_index, SUM(seconds), NOW()
+            FROM activity_zones
+            WHERE athlete_id = %s
+            AND start_date_local >= %s
+            GROUP BY 1, 2, 3, 4
+            ON CONFLICT (athlete_id, week_start, zone_type, zone_index)
+            DO UPDATE SET seconds = EXCLUDED.seconds, updated_at = EXCLUDED.updated_at
+            WHERE weekly_zones.seconds IS DISTINCT FROM EXCLUDED.seconds;
+        """, (athlete_id, week_start))
+    conn.commit()
+
+
+def process_activity_streams(conn, athlete_id=None, max_activities=100):
+    """
+    Fetches streams for the runs not processed yet (most recent first, at most
+    `max_activities` per call: each one costs an API request) and stores the derived
+    tables. Each activity is committed on its own, so an interrupted sync resumes
+    where it stopped. Stops early (returns True) when Strava's rate limit is reached.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT strava_id, COALESCE(athlete_id, %s), start_date_local
+            FROM activities
+            WHERE streams_scanned_at IS NULL
+            AND (type ILIKE '%%Run%%' OR sport_type ILIKE '%%Run%%')
+            ORDER BY start_date_local DESC
+            LIMIT %s;
+        """, (athlete_id, max_activities))
+        pending = cur.fetchall()
+
+    print(f"📈 Scanning streams for {len(pending)} new runs...")
+    zones_by_athlete = {}
+    touched = {}  # athlete_id -> oldest start date scanned, for the weekly rollup
+    rate_limited = False
+    for activity_id, act_athlete_id, start_date in pending:
+        try:
+            streams, response = fetch_streams(activity_id)
+            if act_athlete_id not in zones_by_athlete:
+                zones_by_athlete[act_athlete_id] = load_athlete_zones(conn, act_athlete_id)
+
+            rows = best_effort_rows(activity_id, act_athlete_id, start_date, streams)
+            z_rows = zone_rows(activity_id, act_athlete_id, start_date, streams,
+                               zones_by_athlete[act_athlete_id])
+
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM best_efforts WHERE activity_id = %s", (activity_id,))
+                _bulk_insert(cur, """
+                    INSERT INTO best_efforts
+                    (activity_id, athlete_id, distance_m, start_date_local, elapsed_s, start_offset_s)
+                    VALUES %s
+                """, rows)
+                cur.execute("DELETE FROM activity_zones WHERE activity_id = %s", (activity_id,))
+                _bulk_insert(cur, """
+                    INSERT INTO activity_zones
+                    (activity_id, athlete_id, start_date_local, zone_type, zone_index, seconds)
+                    VALUES %s
+                """, z_rows)
+                cur.execute(
+                    "UPDATE activities SET streams_scanned_at = NOW() WHERE strava_id = %s",
+                    (activity_id,),
+                )
+            conn.commit()
+            if z_rows and act_athlete_id is not None and start_date is not None:
+                touched[act_athlete_id] = min(start_date, touched.get(act_athlete_id, start_date))
+        except Exception as e:
+            conn.rollback()
+            if _is_rate_limit_error(e):
+                rate_limited = True
+                break
+            print(f"❌ Failed to scan streams for {activity_id}: {e}")
+            continue
+        if _rate_limit_reached(response):
+            rate_limited = True
+            break
+
+    if rate_limited:
+        print("⏳ Strava rate limit reached: the remaining runs are scanned next sync.")
+    for act_athlete_id, since in touched.items():
+        rollup_weekly_zones(conn, act_athlete_id, since)
+    return rate_limited
+
+
+#=================================================
+# DETAILS: per-km splits, laps and segment efforts
+# (from GET /activities/{id}?include_all_efforts=true, one API call per activity)
+#=================================================
+
+def create_detail_tables(conn):
+    """
+    activity_splits: Strava's per-km splits (splits_metric), what get_km_splits reads.
+    activity_laps: device / manual laps (intervals).
+    segment_efforts: every segment effort, to follow the same segment over time.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS activity_splits (
+                activity_id BIGINT NOT NULL,
+                split_index INTEGER NOT NULL,        -- 1 = first km
+                athlete_id BIGINT,
+                start_date_local TIMESTAMP,
+                distance_m REAL,
+                elapsed_time_s INTEGER,
+                moving_time_s INTEGER,
+                elevation_difference_m REAL,
+                average_speed_mps REAL,
+                average_heartrate REAL,
+                pace_zone INTEGER,
+                PRIMARY KEY (activity_id, split_index)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_activity_splits_athlete_date
+            ON activity_splits (athlete_id, start_date_local);
+        """)
+        # Used by get_km_splits, which doesn't know the strava athlete id yet
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_activity_splits_date
+            ON activity_splits (start_date_local);
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS activity_laps (
+                lap_id BIGINT PRIMARY KEY,
+                activity_id BIGINT NOT NULL,
+                lap_index INTEGER,
+                athlete_id BIGINT,
+                name VARCHAR(255),
+                start_date_local TIMESTAMP,
+                distance_m REAL,
+                elapsed_time_s INTEGER,
+                moving_time_s INTEGER,
+                elevation_gain_m REAL,
+                average_speed_mps REAL,
+                max_speed_mps REAL,
+                average_cadence REAL,
+                average_heartrate REAL,
+                max_heartrate REAL,
+                pace_zone INTEGER
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_activity_laps_activity
+            ON activity_laps (activity_id, lap_index);
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS segment_efforts (
+                effort_id BIGINT PRIMARY KEY,
+                activity_id BIGINT NOT NULL,
+                segment_id BIGINT,
+                segment_name VARCHAR(255),
+                athlete_id BIGINT,
+                start_date_local TIMESTAMP,
+                distance_m REAL,
+                elapsed_time_s INTEGER,
+                moving_time_s INTEGER,
+                average_heartrate REAL,
+                max_heartrate REAL,
+                pr_rank INTEGER
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_segment_efforts_segment_date
+            ON segment_efforts (segment_id, start_date_local);
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_segment_efforts_activity
+            ON segment_efforts (activity_id);
+        """)
+    conn.commit()
+
+
+def _parse_local_date(value):
+    """'2026-01-01T07:30:00Z' (Strava *_local fields) -> naive datetime, None stays None."""
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value.replace("Z", "")).replace(tzinfo=None)
+
+
+def split_rows(activity_id, athlete_id, start_date, detail):
+    """splits_metric of one detailed activity -> activity_splits rows."""
+    return [
+        (activity_id, s.get("split", i + 1), athlete_id, start_date,
+         s.get("distance"), s.get("elapsed_time"), s.get("moving_time"),
+         s.get("elevation_difference"), s.get("average_speed"),
+         s.get("average_heartrate"), s.get("pace_zone"))
+        for i, s in enumerate(detail.get("splits_metric") or [])
+    ]
+
+
+def lap_rows(activity_id, athlete_id, detail):
+    """laps of one detailed activity -> activity_laps rows."""
+    return [
+        (lap["id"], activity_id, lap.get("lap_index"), athlete_id, lap.get("name"),
+         _parse_local_date(lap.get("start_date_local")),
+         lap.get("distance"), lap.get("elapsed_time"), lap.get("moving_time"),
+         lap.get("total_elevation_gain"), lap.get("average_speed"), lap.get("max_speed"),
+         lap.get("average_cadence"), lap.get("average_heartrate"), lap.get("max_heartrate"),
+         lap.get("pace_zone"))
+        for lap in detail.get("laps") or []
+        if lap.get("id") is not None
+    ]
+
+
+def segment_effort_rows(activity_id, athlete_id, detail):
+    """segment_efforts of one detailed activity -> segment_efforts rows."""
+    rows = []
+    for effort in detail.get("segment_efforts") or []:
+        if effort.get("id") is None:
+            continue
+        segment = effort.get("segment") or {}
+        rows.append((
+            effort["id"], activity_id, segment.get("id"), segment.get("name") or effort.get("name"),
+            athlete_id, _parse_local_date(effort.get("start_date_local")),
+            effort.get("distance"), effort.get("elapsed_time"), effort.get("moving_time"),
+            effort.get("average_heartrate"), effort.get("max_heartrate"), effort.get("pr_rank"),
+        ))
+    return rows
+
+
+def process_activity_details(conn, athlete_id=None, max_activities=100):
+    """
+    Fetches the detailed activity for the runs whose splits / laps / segment efforts
+    are not stored yet (details_fetched_at IS NULL, most recent first, at most
+    `max_activities` per call) and bulk loads the three tables. Same resume logic
+    and rate limit handling as process_activity_streams: one commit per activity,
+    returns True when it stopped on the rate limit.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT strava_id, COALESCE(athlete_id, %s), start_date_local
+            FROM activities
+            WHERE details_fetched_at IS NULL
+            AND (type ILIKE '%%Run%%' OR sport_type ILIKE '%%Run%%')
+            ORDER BY start_date_local DESC
+            LIMIT %s;
+        """, (athlete_id, max_activities))
+        pending = cur.fetchall()
+
+    print(f"🧩 Fetching splits / laps / segments for {len(pending)} runs...")
+    rate_limited = False
+    for activity_id, act_athlete_id, start_date in pending:
+        try:
+            detail, response = raw_get(f"/activities/{activity_id}", params={"include_all_efforts": "true"})
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM activity_splits WHERE activity_id = %s", (activity_id,))
+                _bulk_insert(cur, """
+                    INSERT INTO activity_splits
+                    (activity_id, split_index, athlete_id, start_date_local, distance_m, elapsed_time_s,
+                     moving_time_s, elevation_difference_m, average_speed_mps, average_heartrate, pace_zone)
+                    VALUES %s
+                """, split_rows(activity_id, act_athlete_id, start_date, detail))
+                cur.execute("DELETE FROM activity_laps WHERE activity_id = %s", (activity_id,))
+                _bulk_insert(cur, """
+                    INSERT INTO activity_laps
+                    (lap_id, activity_id, lap_index, athlete_id, name, start_date_local, distance_m,
+                     elapsed_time_s, moving_time_s, elevation_gain_m, average_speed_mps, max_speed_mps,
+                     average_cadence, average_heartrate, max_heartrate, pace_zone)
+                    VALUES %s
+                """, lap_rows(activity_id, act_athlete_id, detail))
+                cur.execute("DELETE FROM segment_efforts WHERE activity_id = %s", (activity_id,))
+                _bulk_insert(cur, """
+                    INSERT INTO segment_efforts
+                    (effort_id, activity_id, segment_id, segment_name, athlete_id, start_date_local,
+                     distance_m, elapsed_time_s, moving_time_s, average_heartrate, max_heartrate, pr_rank)
+                    VALUES %s
+                """, segment_effort_rows(activity_id, act_athlete_id, detail))
+                cur.execute(
+                    "UPDATE activities SET details_fetched_at = NOW() WHERE strava_id = %s",
+                    (activity_id,),
+                )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            if _is_rate_limit_error(e):
+                rate_limited = True
+                break
+            print(f"❌ Failed to fetch details for {activity_id}: {e}")
+            continue
+        if _rate_limit_reached(response):
+            rate_limited = True
+            break
+
+    if rate_limited:
+        print("⏳ Strava rate limit reached: the remaining details are fetched next sync.")
+    return rate_limited
+
+
+#=================================================
+# ROUTES (fingerprint + spatial index, see Scripts/routes.py)
+#=================================================
+
+def create_route_tables(conn):
+    """
+    routes: one row per distinct route of an athlete.
+    activity_routes: route fingerprint of every activity with GPS (+ the raw polyline).
+    route_cells: inverted index cell -> activities, what makes "same route" lookups fast.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS routes (
+                route_id SERIAL PRIMARY KEY,
+                athlete_id BIGINT,
+                first_activity_id BIGINT
+            );
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS activity_routes (
+                activity_id BIGINT PRIMARY KEY,
+                athlete_id BIGINT,
+                route_id INTEGER REFERENCES routes (route_id),
+                n_cells INTEGER NOT NULL,
+                start_cell BIGINT,
+                end_cell BIGINT,
+                summary_polyline TEXT
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_activity_routes_route
+            ON activity_routes (route_id);
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS route_cells (
+                cell BIGINT NOT NULL,
+                activity_id BIGINT NOT NULL,
+                PRIMARY KEY (cell, activity_id)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_route_cells_activity
+            ON route_cells (activity_id);
+        """)
+    conn.commit()
+
+
+def insert_activity_route(conn, activity_id, athlete_id, polyline):
+    """
+    Fingerprints one activity and attaches it to an existing route (best Jaccard match
+    above ROUTE_MATCH_JACCARD) or to a brand new one. Returns the route_id (None = no GPS).
+    """
+    from Scripts.routes import ROUTE_MATCH_JACCARD, find_candidate_matches, route_fingerprint
+
+    fp = route_fingerprint(polyline)
+    if fp is None:
+        return None
+
+    with conn.cursor() as cur:
+        matches = find_candidate_matches(cur, fp["cells"], athlete_id, exclude_activity_id=activity_id)
+        if matches and matches[0][2] >= ROUTE_MATCH_JACCARD:
+            route_id = matches[0][1]
+        else:
+            cur.execute(
+                "INSERT INTO routes (athlete_id, first_activity_id) VALUES (%s, %s) RETURNING route_id",
+                (athlete_id, activity_id),
+            )
+            route_id = cur.fetchone()[0]
+
+        cur.execute("""
+            INSERT INTO activity_routes
+            (activity_id, athlete_id, route_id, n_cells, start_cell, end_cell, summary_polyline)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (activity_id, athlete_id, route_id, len(fp["cells"]), fp["start_cell"], fp["end_cell"], polyline))
+        _bulk_insert(cur, "INSERT INTO route_cells (cell, activity_id) VALUES %s",
+                     [(cell, activity_id) for cell in fp["cells"]])
+    conn.commit()
+    return route_id
+
+
+def raw_route_input(raw, athlete_id=None):
+    """(activity_id, athlete_id, summary_polyline) from a raw activity dict."""
+    polyline = (raw.get("map") or {}).get("summary_polyline")
+    act_athlete_id = (raw.get("athlete") or {}).get("id", athlete_id)
+    return raw["id"], act_athlete_id, polyline
+
+
+def process_routes(conn, route_inputs):
+    """
+    Fingerprints the activities of this batch that are not indexed yet.
+    route_inputs: [(activity_id, athlete_id, summary_polyline)], see raw_route_input.
+    """
+    ids = tuple(activity_id for activity_id, _, _ in route_inputs)
+    if not ids:
+        return
+    with conn.cursor() as cur:
+        cur.execute("SELECT activity_id FROM activity_routes WHERE activity_id IN %s", (ids,))
+        done = {row[0] for row in cur.fetchall()}
+
+    n_new = 0
+    for activity_id, act_athlete_id, polyline in route_inputs:
+        if activity_id in done:
+            continue
+        try:
+            if insert_activity_route(conn, activity_id, act_athlete_id, polyline) is not None:
+                n_new += 1
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Failed to fingerprint route of {activity_id}: {e}")
+    print(f"🗺️ Indexed {n_new} new routes.")
+
+
+#=================================================
+# PIPELINE
+#=================================================
+def run_sync(limit: int = 50):
+    """
+    Fetches the most recent activities from Strava and upserts them into the DB.
+    Used by `python -m app.cli sync` (cron) and by `python -m Scripts.strava_connector`.
+    """
+    print("\n--- 🏃 Starting Strava Pipeline ---")
+
+    # 1) Who am I?
+    me, _ = raw_get("/athlete")
+    athlete_id = me["id"]
+    print(f"👋 Athlete: {me.get('firstname')} {me.get('lastname')} — id={athlete_id}")
+
+    # 2) The `limit` most recent activities, raw JSON like the backfill (same mapper, same hash)
+    acts = list(islice(iter_activities(per_page=min(limit, MAX_PER_PAGE), max_workers=1), limit))
+
+    conn = get_db_connection()
+    try:
+        create_activities_table(conn)
+        create_best_efforts_table(conn)
+        create_zone_tables(conn)
+        create_detail_tables(conn)
+        create_route_tables(conn)
+        sync_hr_zones(conn, athlete_id)
+
+        print("Writing to the DB...")
+        counts = insert_activity_rows(conn, [raw_activity_row(raw) for raw in acts])
+        print(f"✅ Saved: {counts['inserted']} new, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged (skipped)")
+
+        # 3) Derived tables from streams (only for activities not scanned yet)
+        # 4) Splits / laps / segment efforts (only for activities not fetched yet)
+        # Both cost one request per activity and share the 15-min rate limit window:
+        # each pass stops when it's nearly used up, details wait for the next sync.
+        if not process_activity_streams(conn, athlete_id=athlete_id):
+            process_activity_details(conn, athlete_id=athlete_id)
+
+        # 5) Route fingerprints from map.summary_polyline
+        process_routes(conn, [raw_route_input(raw, athlete_id) for raw in acts])
+    finally:
+        conn.close()
+        print("--- Pipeline Finished (Connection Closed) ---")
+
+
+def run_backfill(after=None, batch_size=500, max_workers=4):
+    """
+    Loads the WHOLE history (or everything after the `after` datetime) with the
+    parallel lister, upserting `batch_size` activities per transaction.
+    Memory stays flat: at most a few pages + one batch are alive at any time.
+    Pages go straight from raw JSON to rows (raw_activity_row), no stravalib models.
+    """
+    print("\n--- 🏃 Starting Strava Backfill ---")
+    after_ts = after.timestamp() if after else None
+
+    conn = get_db_connection()
+    try:
+        create_activities_table(conn)
+        create_route_tables(conn)
+
+        totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+        for batch in chunked(iter_activities(max_workers=max_workers, after=after_ts), batch_size):
+            counts = insert_activity_rows(conn, [raw_activity_row(raw) for raw in batch])
+            totals = {k: totals[k] + counts[k] for k in totals}
+            process_routes(conn, [raw_route_input(raw) for raw in batch])
+            print(f"💾 {totals['inserted']} new, {totals['updated']} updated, "
+                  f"{totals['unchanged']} unchanged so far...")
+    finally:
+        conn.close()
+        print("--- Backfill Finished (Connection Closed) ---")
+    # Streams (best efforts, zones) are then picked up by the next `sync`,
+    # a few per run, since they cost one API call per activity.
+
+
+# First run (OAuth) and manual syncs, from the project root (imports go through app / Scripts):
+#   python -m Scripts.strava_connector
 if __name__ == "__main__":
     if not TOKENS_PATH.exists():
         print("Open http://127.0.0.1:5000 to authorize…")
-        app.run("127.0.0.1", 5000, debug=False)
+        create_oauth_app().run("127.0.0.1", 5000, debug=False)
     else:
-        print("\n--- 🏃 Starting Strava Pipeline ---")
-        client = make_client()
-
-        # 1) Who am I?
-        me = client.get_athlete()
-        print(f"👋 Athlete: {me.firstname} {me.lastname} — id={me.id}")
-
-        # 2) Show 5 most recent activities (friendly summary from stravalib objects)
-        acts = list(client.get_activities(limit=50))
-
-        # 3) Raw JSON (exact API format) for the most recent activity
-        if acts:
-            first_id = acts[0].id
-            detail_json, _ = raw_get(f"/activities/{first_id}", params={"include_all_efforts": "true"})
-            import json 
-            with open('detail_json.json', "w") as f:
-                json.dump(detail_json, f)
-            #print("\n🧪 Raw JSON for the latest activity (first 1):")
-            #print(json.dumps(detail_json, indent=2)[:4000])  # avoid flooding the console
-        
-        conn = get_db_connection()
-        create_activities_table(conn)
-            
-        print("Writing to PostgreSQL...")
-        for act in acts:
-            insert_one_activity(conn, act) 
-            
-        if 'conn' in locals() and conn:
-                conn.close()
-                print("--- Pipeline Finished (Connection Closed) ---") 
-        
-            
-            
-            
+        run_sync()
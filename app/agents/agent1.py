@@ -1,28 +1,44 @@
 import os
-from datapizza.agents import Agent
-from datapizza.clients.openai import OpenAIClient # Or Azure, Anthropic
-from datapizza.clients.openai_like import OpenAILikeClient
-from datapizza.clients.google import GoogleClient
 import sys
+from functools import partial
 
-from app.tools.agent1_tools import get_runner_stats, save_training_plan
 from app.config import Config
 # =================
 # The scope of this script is to define and run an agent that:
 # 1. Fetches real runner stats from Postgres.
 # 2. Generates a personalized training plan.    
 # =================
+# NOTE: datapizza (and the tools, which pull in psycopg2) are imported lazily
+# inside the factories below, so importing this module is cheap.
 
+_client = None
+
+
+def _make_live_client():
+    from datapizza.clients.google import GoogleClient
+
+    Config.validate()
+    return GoogleClient(
+        api_key= Config.GEMINI_API_KEY,
+        model = Config.MODEL_NAME,
+        system_prompt='You are an running expert plan architect'
+    )
 
-client = GoogleClient(
-    api_key= Config.GEMINI_API_KEY,
-    model = Config.MODEL_NAME,
-    system_prompt="You are an running expert plan architect"
-)
+
+def get_client():
+    """Builds the LLM client on first use and reuses it afterwards (live, record or replay: Config.LLM_MODE)."""
+    global _client
+    if _client is None:
+        from app.utils.record_replay import client_for
+
+        _client = client_for("planner", _make_live_client)
+    return _client
 
 
 # Alternative Local LLM Client (for testing without API calls)
 '''
+from datapizza.clients.openai_like import OpenAILikeClient
+
 client = OpenAILikeClient(
     api_key= "",
     model = "llama3.1:8b",
@@ -39,7 +55,13 @@ Your only purpose is to trigger tools based on user requests.
 ### YOUR INSTRUCTIONS
 1. Call `get_runner_stats(user_id)` to check the user's fitness.
 2. Based on the stats, GENERATE a JSON training plan in your memory.
-3. Call `save_training_plan(plan_data)` with that JSON.
+3. Call `save_training_plan(plan_data)` with that JSON, in the COMPACT format:
+   {"u": user_id, "goal": goal, "start": first date, "cols": ["dd","type","km","pace","desc"], "rows": [...]}
+   where each row is [days since the previous row (first row: 0), type, km, pace, description].
+
+### READING THE STATS (compact keys)
+wk_km = avg weekly km (last 4 weeks), 5k_min = estimated 5k time (min),
+pred_min = predicted race times in minutes (5k, 10k, half, marathon).
 
 ### STRICT FORMATTING RULES
 - **DO NOT** write Python code.
@@ -52,33 +74,91 @@ User: "Create a plan for user_123."
 Assistant:
 Tool Call: get_runner_stats(user_id="user_123")
 ... (Tool returns stats) ...
-Tool Call: save_training_plan(plan_data='{"user_id": "user_123", 
-                                          "goal_description": "10k in 45m", 
-                                          "workouts": [{"date": "2025-01-01", "distance_km": 5.0}]}')
+Tool Call: save_training_plan(plan_data='{"u":"user_123","goal":"10k in 45m","start":"2025-01-01",
+                                          "cols":["dd","type","km","pace","desc"],
+                                          "rows":[[0,"Easy",5,"6:00","Easy run"],[2,"Tempo",8,"4:50",""]]}')
 
 ### NOW PROCESS THIS REQUEST:
 """
 
-# 3. Initialize the Agent
-agent_1 = Agent(
-    name="ZioPera_Architect",
-    client=client,
-    system_prompt=SYS_PROMPT,
-    tools=[get_runner_stats, save_training_plan], # Register the tools
-   
-)
+# 3. Build the Agent (one per run)
+def build_agent(async_tools: bool = False):
+    """
+    A NEW planner agent. An Agent keeps the conversation memory on the instance, so
+    concurrent runs (HTTP service) must not share one; the client and tools are shared.
+    async_tools: for a_run, the tools run in worker threads (see threaded_tools).
+    """
+    from datapizza.agents import Agent
+    from app.tools.agent1_tools import get_runner_stats, save_training_plan
+
+    tools = [get_runner_stats, save_training_plan]
+    if async_tools:
+        from app.agents.threaded_tools import threaded_tools
 
-def run_planner_pipeline(user_request: str, user_id: str):
+        tools = threaded_tools(tools)
+    return Agent(
+        name="ZioPera_Architect",
+        client=get_client(),
+        system_prompt=SYS_PROMPT,
+        tools=tools, # Register the tools
+    )
+
+
+def _planner_prompt(user_request: str, user_id: str, stats: str = None):
+    # We inject the user_id into the prompt context so the agent knows who to look up
+    full_prompt = f"User ID: {user_id}. Request: {user_request}"
+    if stats is not None:
+        full_prompt += (
+            f"\nStep 1 is DONE, get_runner_stats(user_id=\"{user_id}\") returned: {stats}"
+            "\nDo NOT call get_runner_stats again: go straight to step 2."
+        )
+    return full_prompt
+
+
+def run_planner_pipeline(user_request: str, user_id: str, prefetch: bool = None):
     """
     The entry point for our backend API.
+    With prefetch (default: Config.AGENT_PREFETCH) the runner stats are loaded while the
+    agent is built and handed to the model, so its first turn already writes the plan.
     """
     print(f"🤖 Agent 1 Active. Processing: {user_request}")
+
+    stats = None
+    if prefetch is None:
+        prefetch = Config.AGENT_PREFETCH
+    if prefetch:
+        from app.agents.prefetch import prefetch_with_agent
+        from app.tools.agent1_tools import get_runner_stats
+
+        agent, stats = prefetch_with_agent(build_agent, get_runner_stats, user_id=user_id)
+    else:
+        agent = build_agent()
+
+    response = agent.run(_planner_prompt(user_request, user_id, stats))
     
-    # We inject the user_id into the prompt context so the agent knows who to look up
-    full_prompt = f"User ID: {user_id}. Request: {user_request}"
-    
-    response = agent_1.run(full_prompt)
-    
+    print("✅ Pipeline Finished.")
+    return response
+
+
+async def a_run_planner_pipeline(user_request: str, user_id: str, prefetch: bool = None):
+    """Async run_planner_pipeline (used by the HTTP service): the LLM calls don't block a thread."""
+    print(f"🤖 Agent 1 Active (async). Processing: {user_request}")
+
+    stats = None
+    if prefetch is None:
+        prefetch = Config.AGENT_PREFETCH
+    if prefetch:
+        from app.agents.prefetch import a_prefetch_with_agent
+        from app.tools.agent1_tools import get_runner_stats
+
+        agent, stats = await a_prefetch_with_agent(
+            partial(build_agent, async_tools=True), get_runner_stats, user_id=user_id
+        )
+    else:
+        agent = build_agent(async_tools=True)
+
+    response = await agent.a_run(_planner_prompt(user_request, user_id, stats))
+
     print("✅ Pipeline Finished.")
     return response
 
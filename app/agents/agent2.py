@@ -1,19 +1,34 @@
 import os
-from datapizza.agents import Agent
-from datapizza.clients.openai import OpenAIClient # Or Azure, Anthropic
-from datapizza.clients.openai_like import OpenAILikeClient
-from datapizza.clients.google import GoogleClient
 import sys
+from functools import partial
 
-from app.tools.agent2_tools import compare_plan_vs_actual, update_training_plan
 from app.config import Config
 
+# NOTE: datapizza and the tools are imported lazily inside the factories below,
+# so importing this module is cheap (same pattern as agent1).
 
-client = GoogleClient(
-    api_key= Config.GEMINI_API_KEY,
-    model = Config.MODEL_NAME,
-    system_prompt="You are an expert running coach managing an athlete's progress."
-)
+_client = None
+
+
+def _make_live_client():
+    from datapizza.clients.google import GoogleClient
+
+    Config.validate()
+    return GoogleClient(
+        api_key= Config.GEMINI_API_KEY,
+        model = Config.MODEL_NAME,
+        system_prompt="You are an expert running coach managing an athlete's progress."
+    )
+
+
+def get_client():
+    """Builds the LLM client on first use and reuses it afterwards (live, record or replay: Config.LLM_MODE)."""
+    global _client
+    if _client is None:
+        from app.utils.record_replay import client_for
+
+        _client = client_for("coach", _make_live_client)
+    return _client
 
 
 # The System Prompt for the Coach
@@ -24,13 +39,22 @@ Your goal is to KEEP THE PLAN REALISTIC based on actual performance.
 ### YOUR PROCESS
 1. Receive a `user_id` and a `check_date` (usually yesterday).
 2. Call `compare_plan_vs_actual(user_id, date)`.
-3. ANALYZE the result:
-   - If `compliance_percent` > 50%: DO NOTHING. Praise the user.
-   - If `compliance_percent` < 50% (Missed Run): You MUST reschedule.
+3. ANALYZE the result (compact keys: plan_km / act_km = planned / actual km, pct = compliance percent,
+   next = the plan's workouts of the following days, same table format as below):
+   - If `pct` > 50%: DO NOTHING. Praise the user.
+   - If `pct` < 50% (Missed Run): You MUST reschedule.
      - Move the missed key run to a later date?
      - Reduce volume for the rest of the week?
+   - Optionally call `get_intensity_distribution(user_id)` to see if recent training was too hard
+     (too little easy Z1-Z2 time) before deciding how to reschedule.
+   - Optionally call `get_km_splits(user_id, date)` to see HOW the run went km by km
+     (even pacing, fast start, pace fading at the end).
+   - Optionally call `get_route_history(user_id, date)` to compare the pace with the earlier
+     runs on the same route.
 4. IF rescheduling is needed:
-   - Generate a JSON list of NEW workouts starting from tomorrow.
+   - Generate the NEW workouts starting from tomorrow, as a compact table:
+     {"start": "YYYY-MM-DD", "cols": ["dd","type","km","pace","desc"], "rows": [[0,"Easy",5,"6:00",""], [2,"Long",14,"5:45",""]]}
+     (dd = days since the previous row, first row: 0).
    - Call `update_training_plan(plan_id, new_workouts_json)`.
    - Output a text explanation to the user (e.g., "I noticed you missed yesterday's run, so I shifted your long run to Sunday.").
 
@@ -40,12 +64,94 @@ Your goal is to KEEP THE PLAN REALISTIC based on actual performance.
 - Always output the final text message to the user.
 """
 
-agent_coach = Agent(
-    name="ZioPera_Coach",
-    client=client, 
-    system_prompt=COACH_SYS_PROMPT,
-    tools=[compare_plan_vs_actual, update_training_plan]
-)
+def build_coach_agent(async_tools: bool = False):
+    """
+    A NEW coach agent. An Agent keeps the conversation memory on the instance, so
+    concurrent runs (HTTP service) must not share one; the client and tools are shared.
+    async_tools: for a_run, the tools run in worker threads (see threaded_tools).
+    """
+    from datapizza.agents import Agent
+    from app.tools.agent2_tools import (
+        compare_plan_vs_actual,
+        get_intensity_distribution,
+        get_km_splits,
+        get_route_history,
+        update_training_plan,
+    )
+
+    tools = [compare_plan_vs_actual, update_training_plan, get_intensity_distribution, get_km_splits,
+             get_route_history]
+    if async_tools:
+        from app.agents.threaded_tools import threaded_tools
+
+        tools = threaded_tools(tools)
+    return Agent(
+        name="ZioPera_Coach",
+        client=get_client(), 
+        system_prompt=COACH_SYS_PROMPT,
+        tools=tools
+    )
+
+
+def _coach_prompt(check_date: str, user_id: str, comparison: str = None):
+    prompt = f"Check my progress for {check_date} and adjust if necessary. User: {user_id}"
+    if comparison is not None:
+        prompt += (
+            f"\nStep 2 is DONE, compare_plan_vs_actual(user_id=\"{user_id}\", date=\"{check_date}\") "
+            f"returned: {comparison}"
+            "\nDo NOT call compare_plan_vs_actual again: go straight to step 3."
+        )
+    return prompt
+
+
+def run_coach_pipeline(check_date: str, user_id: str, prefetch: bool = None):
+    """
+    Daily check: compares plan vs actual for `check_date` and reschedules if needed.
+    With prefetch (default: Config.AGENT_PREFETCH) the comparison runs while the agent
+    is built and goes into the prompt, saving the model's first round trip.
+    """
+    print(f"🕵️ Coach checking status for {check_date}...")
+
+    comparison = None
+    if prefetch is None:
+        prefetch = Config.AGENT_PREFETCH
+    if prefetch:
+        from app.agents.prefetch import prefetch_with_agent
+        from app.tools.agent2_tools import compare_plan_vs_actual
+
+        agent, comparison = prefetch_with_agent(
+            build_coach_agent, compare_plan_vs_actual, user_id=user_id, date=check_date
+        )
+    else:
+        agent = build_coach_agent()
+
+    response = agent.run(_coach_prompt(check_date, user_id, comparison))
+
+    print("✅ Coach Finished.")
+    return response
+
+
+async def a_run_coach_pipeline(check_date: str, user_id: str, prefetch: bool = None):
+    """Async run_coach_pipeline (used by the HTTP service)."""
+    print(f"🕵️ Coach checking status for {check_date} (async)...")
+
+    comparison = None
+    if prefetch is None:
+        prefetch = Config.AGENT_PREFETCH
+    if prefetch:
+        from app.agents.prefetch import a_prefetch_with_agent
+        from app.tools.agent2_tools import compare_plan_vs_actual
+
+        agent, comparison = await a_prefetch_with_agent(
+            partial(build_coach_agent, async_tools=True), compare_plan_vs_actual, user_id=user_id, date=check_date
+        )
+    else:
+        agent = build_coach_agent(async_tools=True)
+
+    response = await agent.a_run(_coach_prompt(check_date, user_id, comparison))
+
+    print("✅ Coach Finished.")
+    return response
 
 
 if __name__ == "__main__":
@@ -54,8 +160,4 @@ if __name__ == "__main__":
     
     date_to_check = "2026-01-01" 
     
-    print(f"🕵️ Coach checking status for {date_to_check}...")
-    
-    prompt = f"Check my progress for {date_to_check} and adjust if necessary. User: user_123"
-    
-    agent_coach.run(prompt)
\ No newline at end of file
+    run_coach_pipeline(date_to_check, user_id="user_123")
\ No newline at end of file
@@ -0,0 +1,54 @@
+# =================
+# Speculative tool prefetch.
+# Both pipelines always start with the same deterministic tool call
+# (get_runner_stats for the planner, compare_plan_vs_actual for the coach).
+# Letting the model "decide" to call it costs a full LLM round trip, so the
+# pipeline runs it itself, in parallel with the agent setup, and puts the
+# result straight into the first prompt.
+# =================
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Prefixes of the error strings the tools return instead of raising
+TOOL_ERROR_PREFIXES = ("Error", "Agent_2: Error")
+
+
+def prefetch_with_agent(build_agent, tool_fn, **tool_kwargs):
+    """
+    Runs `build_agent()` and `tool_fn(**tool_kwargs)` concurrently.
+    Returns (agent, tool_result); tool_result is None when the tool failed,
+    so the caller can fall back to letting the model call it.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        agent_future = pool.submit(build_agent)
+        tool_future = pool.submit(tool_fn, **tool_kwargs)
+        agent = agent_future.result()
+        try:
+            result = tool_future.result()
+        except Exception as e:
+            print(f"⚠️ Prefetch of {getattr(tool_fn, 'name', tool_fn)} failed: {e}")
+            return agent, None
+
+    return agent, _usable(result)
+
+
+async def a_prefetch_with_agent(build_agent, tool_fn, **tool_kwargs):
+    """Async version of prefetch_with_agent: both run in worker threads, the event loop stays free."""
+    agent, result = await asyncio.gather(
+        asyncio.to_thread(build_agent),
+        asyncio.to_thread(tool_fn, **tool_kwargs),
+        return_exceptions=True,
+    )
+    if isinstance(agent, BaseException):
+        raise agent
+    if isinstance(result, BaseException):
+        print(f"⚠️ Prefetch of {getattr(tool_fn, 'name', tool_fn)} failed: {result}")
+        return agent, None
+    return agent, _usable(result)
+
+
+def _usable(result):
+    """The tool result, or None if the tool reported an error."""
+    if not isinstance(result, str) or result.startswith(TOOL_ERROR_PREFIXES):
+        return None
+    return result
@@ -0,0 +1,34 @@
+# =================
+# Async versions of the (sync, DB-bound) tools for Agent.a_run.
+# datapizza's runner calls a tool inline and only awaits the result if it is a
+# coroutine, so a sync tool would open its DB connection and query ON the event
+# loop thread, stalling every other request of the HTTP service meanwhile.
+# These wrappers run the same function in a worker thread instead.
+# =================
+import asyncio
+
+
+def threaded_tool(sync_tool):
+    """Same name, description and schema as `sync_tool`; calling it returns a coroutine."""
+    from datapizza.tools import Tool
+
+    func = sync_tool.func
+
+    async def run(**kwargs):
+        return await asyncio.to_thread(func, **kwargs)
+
+    run.__name__ = func.__name__
+    run.__doc__ = func.__doc__
+    return Tool(
+        func=run,
+        name=sync_tool.name,
+        description=sync_tool.description,
+        end=sync_tool.end_invoke,
+        properties=sync_tool.properties,
+        required=sync_tool.required,
+        strict=sync_tool.strict,
+    )
+
+
+def threaded_tools(tools):
+    return [threaded_tool(t) for t in tools]
@@ -0,0 +1,127 @@
+# =================
+# In-process job manager for the HTTP service (pure asyncio, no web framework in here).
+#   - concurrency: at most `max_concurrent` agent runs at the same time (semaphore)
+#   - backpressure: at most `max_pending` unfinished jobs overall (-> 503) and
+#                   `max_per_user` per user (-> 429); callers get a Retry-After instead of a queue that grows forever
+#   - coalescing: an identical request (same kind + key) already in flight returns the SAME job,
+#                 so a double-click or a retrying client never pays for a second agent run
+# =================
+import asyncio
+import time
+import uuid
+
+
+class Backpressure(Exception):
+    """Raised by JobManager.submit when the service is full. status: 503 (global) or 429 (per user)."""
+
+    def __init__(self, status, message, retry_after_s):
+        super().__init__(message)
+        self.status = status
+        self.retry_after_s = retry_after_s
+
+
+class Job:
+    def __init__(self, kind, user_id, key):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.key = key
+        self.status = "queued"  # queued -> running -> done | failed
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    def __init__(self, max_concurrent=4, max_pending=64, max_per_user=2, job_ttl_s=3600, retry_after_s=5):
+        self.max_pending = max_pending
+        self.max_per_user = max_per_user
+        self.job_ttl_s = job_ttl_s
+        self.retry_after_s = retry_after_s
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._jobs = {}       # job_id -> Job
+        self._in_flight = {}  # (kind, key) -> Job, only unfinished jobs
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def stats(self):
+        pending = list(self._in_flight.values())
+        return {
+            "queued": sum(j.status == "queued" for j in pending),
+            "running": sum(j.status == "running" for j in pending),
+            "jobs_kept": len(self._jobs),
+        }
+
+    def submit(self, kind, user_id, key, run):
+        """
+        Schedules `run()` (a coroutine function) as a job. Returns (job, coalesced).
+        Runs on the event loop thread only, so no locking is needed.
+        """
+        self._prune()
+
+        existing = self._in_flight.get((kind, key))
+        if existing is not None:
+            return existing, True
+
+        if len(self._in_flight) >= self.max_pending:
+            raise Backpressure(503, "Too many jobs in progress, retry later", self.retry_after_s)
+        if sum(j.user_id == user_id for j in self._in_flight.values()) >= self.max_per_user:
+            raise Backpressure(429, f"Too many jobs in progress for {user_id}", self.retry_after_s)
+
+        job = Job(kind, user_id, key)
+        self._jobs[job.job_id] = job
+        self._in_flight[(kind, key)] = job
+        job.task = asyncio.create_task(self._run(job, run))
+        return job, False
+
+    async def _run(self, job, run):
+        try:
+            async with self._semaphore:
+                job.status = "running"
+                job.started_at = time.time()
+                job.result = await run()
+                job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            print(f"❌ [API] job {job.job_id} ({job.kind}) failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            self._in_flight.pop((job.kind, job.key), None)
+
+    def _prune(self):
+        """Forgets finished jobs older than job_ttl_s (the service keeps no DB of jobs)."""
+        cutoff = time.time() - self.job_ttl_s
+        for job_id in [j.job_id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def wait(self, job, timeout_s):
+        """Waits up to timeout_s for the job to finish (lets fast runs answer in one request)."""
+        if job.finished or not timeout_s:
+            return job
+        try:
+            await asyncio.wait_for(asyncio.shield(job.task), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            pass
+        return job
@@ -0,0 +1,112 @@
+# =================
+# Async HTTP service for the agents (FastAPI + uvicorn):
+#   POST /plans                  {"user_id", "request"}       -> 202 job (planner, Agent 1)
+#   POST /checks                 {"user_id", "date"?}         -> 202 job (daily coach check, Agent 2)
+#   GET  /jobs/{job_id}                                        -> job status / result (polling)
+#   GET  /users/{user_id}/stats                                -> runner stats (no LLM, answered inline)
+#   GET  /health                                               -> queue counters
+# Agent runs use Agent.a_run, so a multi-second LLM call waits on the event loop
+# instead of holding a thread. See app/api/jobs.py for limits and coalescing.
+#
+# Run with: python -m app.cli serve [--host 127.0.0.1] [--port 8000]
+# =================
+import asyncio
+import datetime
+import json
+
+from app.api.jobs import Backpressure, JobManager
+from app.config import Config
+
+
+def _result_text(step):
+    """Agent StepResult -> the final text for the client."""
+    return getattr(step, "text", None) if step is not None else None
+
+
+def create_api_app():
+    from fastapi import Body, FastAPI, HTTPException
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI(title="ZioPera Coach API")
+    jobs = JobManager(
+        max_concurrent=Config.API_MAX_CONCURRENT_RUNS,
+        max_pending=Config.API_MAX_PENDING_JOBS,
+        max_per_user=Config.API_MAX_JOBS_PER_USER,
+        job_ttl_s=Config.API_JOB_TTL_S,
+    )
+    app.state.jobs = jobs
+
+    async def submit(kind, user_id, key, run, wait_s):
+        try:
+            job, coalesced = jobs.submit(kind, user_id, key, run)
+        except Backpressure as e:
+            return JSONResponse(
+                {"error": str(e)},
+                status_code=e.status,
+                headers={"Retry-After": str(e.retry_after_s)},
+            )
+        await jobs.wait(job, min(float(wait_s or 0), 30.0))
+        body = dict(job.to_dict(), coalesced=coalesced)
+        return JSONResponse(body, status_code=200 if job.finished else 202)
+
+    @app.post("/plans")
+    async def create_plan(payload: dict = Body(...), wait: float = 0):
+        from app.agents.agent1 import a_run_planner_pipeline
+
+        user_id, user_request = payload.get("user_id"), payload.get("request")
+        if not user_id or not user_request:
+            raise HTTPException(400, "'user_id' and 'request' are required")
+
+        async def run():
+            return _result_text(await a_run_planner_pipeline(user_request, user_id=user_id))
+
+        # Same user + same request text = same plan: share the in-flight run
+        return await submit("plan", user_id, (user_id, " ".join(user_request.lower().split())), run, wait)
+
+    @app.post("/checks")
+    async def daily_check(payload: dict = Body(...), wait: float = 0):
+        from app.agents.agent2 import a_run_coach_pipeline
+
+        user_id = payload.get("user_id")
+        if not user_id:
+            raise HTTPException(400, "'user_id' is required")
+        check_date = payload.get("date") or (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+        try:
+            datetime.date.fromisoformat(check_date)
+        except ValueError:
+            raise HTTPException(400, "'date' must be YYYY-MM-DD")
+
+        async def run():
+            return _result_text(await a_run_coach_pipeline(check_date, user_id=user_id))
+
+        return await submit("check", user_id, (user_id, check_date), run, wait)
+
+    @app.get("/jobs/{job_id}")
+    async def job_status(job_id: str, wait: float = 0):
+        job = jobs.get(job_id)
+        if job is None:
+            raise HTTPException(404, "Unknown (or expired) job")
+        await jobs.wait(job, min(float(wait or 0), 30.0))
+        return job.to_dict()
+
+    @app.get("/users/{user_id}/stats")
+    async def runner_stats(user_id: str):
+        from app.tools.agent1_tools import get_runner_stats
+
+        # Plain DB read: in a worker thread, the event loop stays free
+        result = await asyncio.to_thread(get_runner_stats, user_id=user_id)
+        if result.startswith("Error"):
+            raise HTTPException(500, result)
+        return json.loads(result)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", **jobs.stats()}
+
+    return app
+
+
+def run_server(host="127.0.0.1", port=8000):
+    import uvicorn
+
+    uvicorn.run(create_api_app(), host=host, port=port)
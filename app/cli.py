@@ -0,0 +1,190 @@
+import argparse
+import datetime
+import sys
+
+# =================
+# Single entry point for cron jobs and manual runs:
+#   python -m app.cli sync  [--limit 50] [--backfill [--after 2020-01-01]]
+#   python -m app.cli plan  "Create a plan to run 10km in 45 minutes" [--user-id user_123] [--no-prefetch]
+#   python -m app.cli coach [--date 2026-01-01] [--user-id user_123] [--no-prefetch]
+#   python -m app.cli plot  [--cumulative] [--archive] [--dashboard [--save out.png]]
+#   python -m app.cli archive                       (incremental Parquet export)
+#   python -m app.cli import-plans plans.jsonl      (bulk plan import, one transaction)
+#   python -m app.cli bench plan|coach [--runs 5]   (use with LLM_MODE=replay for offline profiling)
+#   python -m app.cli serve [--host 127.0.0.1] [--port 8000]
+#
+# Keep the top of this file light: every subcommand imports what it needs
+# inside its handler, so e.g. `sync` never imports datapizza/matplotlib.
+# =================
+
+DEFAULT_USER_ID = "user_123"
+
+
+def cmd_sync(args):
+    from Scripts.strava_connector import TOKENS_PATH, create_oauth_app, run_backfill, run_sync
+
+    if not TOKENS_PATH.exists():
+        print("Open http://127.0.0.1:5000 to authorize…")
+        create_oauth_app().run("127.0.0.1", 5000, debug=False)
+        return
+    if args.backfill:
+        after = datetime.datetime.fromisoformat(args.after) if args.after else None
+        run_backfill(after=after, max_workers=args.workers)
+    else:
+        run_sync(limit=args.limit)
+
+
+def cmd_plan(args):
+    from app.agents.agent1 import run_planner_pipeline
+
+    run_planner_pipeline(args.request, user_id=args.user_id, prefetch=args.prefetch)
+
+
+def cmd_coach(args):
+    from app.agents.agent2 import run_coach_pipeline
+
+    check_date = args.date or (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    run_coach_pipeline(check_date, user_id=args.user_id, prefetch=args.prefetch)
+
+
+def cmd_plot(args):
+    source = "archive" if args.archive else "db"
+    if args.dashboard:
+        from Scripts.plots.dashboard import plot_dashboard
+
+        plot_dashboard(args.user_id, source=source, save_path=args.save)
+        return
+
+    from Scripts.plots.plots import load_daily_running_distance, plot_daily_running_distance
+
+    df = load_daily_running_distance(source=source)
+    plot_daily_running_distance(df, cumulative=args.cumulative)
+
+
+def cmd_archive(args):
+    from Scripts.archive import run_export
+
+    run_export()
+
+
+def cmd_import_plans(args):
+    import json
+
+    from app.utils.database import get_db_connection
+    from app.utils.plans import import_plan_payloads
+
+    # JSON list of plans, or JSON Lines (one plan per line), in the save_training_plan format
+    with open(args.path) as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        payloads = json.loads(text)
+    else:
+        payloads = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    conn = get_db_connection()
+    try:
+        plan_ids = import_plan_payloads(conn, payloads)
+    finally:
+        conn.close()
+    print(f"💾 Imported {len(plan_ids)} plans.")
+
+
+def cmd_bench(args):
+    import statistics
+    import time
+
+    if args.pipeline == "plan":
+        from app.agents.agent1 import get_client, run_planner_pipeline
+
+        def run():
+            run_planner_pipeline(args.request, user_id=args.user_id)
+    else:
+        from app.agents.agent2 import get_client, run_coach_pipeline
+
+        def run():
+            run_coach_pipeline(args.date, user_id=args.user_id)
+
+    timings = []
+    for _ in range(args.runs):
+        client = get_client()
+        if hasattr(client, "rewind"):  # replay: every run replays the whole fixture
+            client.rewind()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    print(f"⏱️ {args.pipeline} x{args.runs}: mean {statistics.mean(timings):.3f}s, "
+          f"median {statistics.median(timings):.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s")
+
+
+def cmd_serve(args):
+    from app.api.server import run_server
+
+    run_server(host=args.host, port=args.port)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ziopera", description="Strava ZioPera Coach")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("sync", help="Fetch recent Strava activities into the DB")
+    p.add_argument("--limit", type=int, default=50)
+    p.add_argument("--backfill", action="store_true", help="Load the whole history (parallel pages)")
+    p.add_argument("--after", help="Backfill only activities after this date (YYYY-MM-DD)")
+    p.add_argument("--workers", type=int, default=4, help="Pages fetched in parallel during a backfill")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("plan", help="Run the planner agent (Agent 1)")
+    p.add_argument("request", help='e.g. "Create a plan to run 10km in 45 minutes"')
+    p.add_argument("--user-id", default=DEFAULT_USER_ID)
+    p.add_argument("--no-prefetch", dest="prefetch", action="store_false", default=None,
+                   help="Let the model call get_runner_stats itself (one extra LLM round trip)")
+    p.set_defaults(func=cmd_plan)
+
+    p = sub.add_parser("coach", help="Run the daily coach check (Agent 2)")
+    p.add_argument("--date", help="YYYY-MM-DD (default: yesterday)")
+    p.add_argument("--user-id", default=DEFAULT_USER_ID)
+    p.add_argument("--no-prefetch", dest="prefetch", action="store_false", default=None,
+                   help="Let the model call compare_plan_vs_actual itself (one extra LLM round trip)")
+    p.set_defaults(func=cmd_coach)
+
+    p = sub.add_parser("plot", help="Plot daily running distance")
+    p.add_argument("--cumulative", action="store_true")
+    p.add_argument("--archive", action="store_true", help="Read the Parquet archive instead of the live DB")
+    p.add_argument("--dashboard", action="store_true",
+                   help="Multi-year dashboard: calendar heatmaps, weekly volume, plan vs actual")
+    p.add_argument("--user-id", default=DEFAULT_USER_ID, help="Whose active plan to overlay (--dashboard)")
+    p.add_argument("--save", help="Save the dashboard to this file instead of showing it")
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser("archive", help="Export new/changed rows to the partitioned Parquet archive")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("import-plans", help="Bulk import training plans (JSON list or JSON Lines)")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_import_plans)
+
+    p = sub.add_parser("bench", help="Time the planner / coach pipelines end to end")
+    p.add_argument("pipeline", choices=["plan", "coach"])
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--request", default="Create a plan to run 10km in 45 minutes")
+    p.add_argument("--date", default="2026-01-01", help="coach: date to check")
+    p.add_argument("--user-id", default=DEFAULT_USER_ID)
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("serve", help="Run the async HTTP API (plans, daily checks, stats)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,6 +14,13 @@ class Config:
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     
     # Database Settings
+    # "postgres" (default) or "sqlite" (embedded, no server: single-athlete installs / CI)
+    DB_BACKEND = os.getenv("DB_BACKEND", "postgres").lower()
+    SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(project_root, "ziopera.db"))
+
+    # Cold archive: partitioned Parquet written by Scripts/archive.py, queried with DuckDB
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(project_root, "archive"))
+
     POSTGRES_DB = os.getenv("POSTGRES_DB")
     POSTGRES_USER = os.getenv("POSTGRES_USER")
     POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
@@ -22,15 +29,36 @@ class Config:
 
     # Agent Settings - Pinned version for stability
     MODEL_NAME = "gemini-flash-latest"
+    # Pipelines run their first (deterministic) tool themselves and skip one LLM round trip
+    AGENT_PREFETCH = os.getenv("AGENT_PREFETCH", "1").lower() not in ("0", "false", "no")
+
+    # LLM record / replay (offline benchmarks, see app/utils/record_replay.py)
+    # "live" (default), "record" (live + save every exchange) or "replay" (no network)
+    LLM_MODE = os.getenv("LLM_MODE", "live").lower()
+    LLM_FIXTURES_DIR = os.getenv("LLM_FIXTURES_DIR", os.path.join(project_root, "fixtures", "llm"))
+    # Simulated seconds per replayed call; empty = the latency measured while recording
+    LLM_REPLAY_LATENCY_S = float(os.getenv("LLM_REPLAY_LATENCY_S")) if os.getenv("LLM_REPLAY_LATENCY_S") else None
+
+    # HTTP service (app/api/server.py)
+    API_MAX_CONCURRENT_RUNS = int(os.getenv("API_MAX_CONCURRENT_RUNS", "4"))   # agent runs at the same time
+    API_MAX_PENDING_JOBS = int(os.getenv("API_MAX_PENDING_JOBS", "64"))        # queued + running, then 503
+    API_MAX_JOBS_PER_USER = int(os.getenv("API_MAX_JOBS_PER_USER", "2"))       # then 429
+    API_JOB_TTL_S = int(os.getenv("API_JOB_TTL_S", "3600"))                    # finished jobs kept for polling
 
     @classmethod
     def validate(cls):
         """Checks if critical keys are missing and warns the user."""
-        if not cls.GEMINI_API_KEY:
+        if not cls.GEMINI_API_KEY and cls.LLM_MODE != "replay":
             raise ValueError("❌ CRITICAL ERROR: GEMINI_API_KEY is missing from .env file!")
         
-        if not cls.POSTGRES_PASSWORD:
+        if cls.DB_BACKEND not in ("postgres", "sqlite"):
+            raise ValueError(f"❌ CRITICAL ERROR: unknown DB_BACKEND '{cls.DB_BACKEND}' (use postgres or sqlite)")
+
+        if cls.LLM_MODE not in ("live", "record", "replay"):
+            raise ValueError(f"❌ CRITICAL ERROR: unknown LLM_MODE '{cls.LLM_MODE}' (use live, record or replay)")
+
+        if cls.DB_BACKEND == "postgres" and not cls.POSTGRES_PASSWORD:
             print("⚠️ Warning: POSTGRES_PASSWORD is empty or missing.")
 
-# Run validation immediately when this file is imported
-Config.validate()
\ No newline at end of file
+# NOTE: validation is NOT run on import anymore (it made every import pay for it).
+# Whoever actually needs the keys (e.g. the agent factories) calls Config.validate().
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, List, Optional
 from datetime import date
 
 class UserStats(BaseModel):
@@ -8,6 +8,7 @@ class UserStats(BaseModel):
     avg_weekly_km: float
     recent_5k_time_min: float
     injury_status: str
+    race_predictions_min: Optional[Dict[str, float]] = None
 
 class Workout(BaseModel):
     date: str
@@ -16,6 +17,12 @@ class Workout(BaseModel):
     description: str
     target_pace: Optional[str]
 
+    @field_validator("date")
+    @classmethod
+    def _iso_date(cls, value):
+        # Stored in a DATE column: reject anything that isn't YYYY-MM-DD up front
+        return date.fromisoformat(value[:10]).isoformat()
+
 class TrainingPlan(BaseModel):
     goal: str
     workouts: List[Workout]
\ No newline at end of file
@@ -2,22 +2,50 @@ from datapizza.tools import tool
 from dotenv import load_dotenv
 import os 
 import json 
+import math
+from datetime import datetime, timedelta
 
 from app.domain.models import UserStats
+from app.utils.context_pack import log_context_size, pack, unpack_plan
 from app.utils.database import get_db_connection
+from app.utils.plans import import_plans, plan_from_payload
 # In a real app, you would import your DB repository here
 
 load_dotenv()
 
 
+# Race distances we predict, from the precomputed best_efforts table
+RACE_DISTANCES_M = {"5k": 5000, "10k": 10000, "half": 21097, "marathon": 42195}
+
+
+def predict_race_time_s(known_dist_m, known_time_s, target_dist_m):
+    """Riegel formula: T2 = T1 * (D2 / D1) ^ 1.06"""
+    return known_time_s * (target_dist_m / known_dist_m) ** 1.06
+
+
+def predict_race_times(best_by_dist):
+    """
+    best_by_dist: {distance_m: best_elapsed_s} from best_efforts.
+    For every race distance we start from the effort whose distance is closest
+    (on a log scale) to the target, since Riegel gets worse the further it extrapolates.
+    """
+    predictions = {}
+    if not best_by_dist:
+        return predictions
+    for label, target in RACE_DISTANCES_M.items():
+        base = min(best_by_dist, key=lambda d: abs(math.log(target / d)))
+        predictions[label] = round(predict_race_time_s(base, best_by_dist[base], target) / 60, 1)
+    return predictions
+
 
 @tool
 def get_runner_stats(user_id: str) -> str:
     """
-    Fetches REAL historical performance from the Postgres 'activities' table.
+    Fetches REAL historical performance from the 'activities' table.
     Calculates:
     1. Average Weekly Volume (last 4 weeks).
-    2. Estimated 5k time (based on fastest recent run).
+    2. Estimated 5k time (fastest 5k effort of the last 90 days, from best_efforts).
+    3. Predicted race times (5k, 10k, half, marathon) from those best efforts.
     """
     conn = None
     try:
@@ -26,42 +54,59 @@ def get_runner_stats(user_id: str) -> str:
 
         # --- METRIC 1: AVERAGE WEEKLY VOLUME (Last 28 Days) ---
         # Logic: Sum distance of all runs in last 28 days, divide by 4.
+        # (date windows are computed here, not with INTERVAL, so the SQL runs on SQLite too)
+        now = datetime.now()
         query_vol = """
             SELECT SUM(distance_m) as total_dist
             FROM activities 
-            WHERE (type ILIKE '%Run%' OR sport_type ILIKE '%Run%')
-            AND start_date_local >= NOW() - INTERVAL '28 days';
+            WHERE (type ILIKE '%%Run%%' OR sport_type ILIKE '%%Run%%')
+            AND start_date_local >= %s;
         """
-        cur.execute(query_vol)
+        cur.execute(query_vol, (now - timedelta(days=28),))
         result_vol = cur.fetchone()
         
         total_meters = result_vol[0] if result_vol and result_vol[0] else 0
         avg_weekly_km = (total_meters / 1000.0) / 4.0
 
-        # --- METRIC 2: RECENT 5K TIME (Proxy for Fitness) ---
-        # Logic: Find the fastest run >= 5km in the last 90 days.
-        # We use average_speed_mps (meters per second) to calculate 5k time.
-        query_speed = """
-            SELECT average_speed_mps 
-            FROM activities 
-            WHERE (type ILIKE '%Run%' OR sport_type ILIKE '%Run%')
-            AND distance_m >= 5000 
-            AND start_date_local >= NOW() - INTERVAL '90 days'
-            ORDER BY average_speed_mps DESC
-            LIMIT 1;
+        # --- METRIC 2: RECENT BEST EFFORTS (Proxy for Fitness) ---
+        # best_efforts is filled ONCE at ingestion from the streams (fastest 400m..marathon
+        # segment inside every run), so this is a single indexed read.
+        # NOTE: no athlete filter yet, the DB only holds one athlete (see agent1).
+        query_best = """
+            SELECT distance_m, MIN(elapsed_s)
+            FROM best_efforts
+            WHERE start_date_local >= %s
+            GROUP BY distance_m;
         """
-        cur.execute(query_speed)
-        result_speed = cur.fetchone()
-
-        if result_speed and result_speed[0]:
-            speed_mps = result_speed[0]
-            # Time = Distance / Speed
-            # 5000m / speed (m/s) = seconds. / 60 = minutes.
-            est_5k_time_min = (5000 / speed_mps) / 60
+        cur.execute(query_best, (now - timedelta(days=90),))
+        best_by_dist = {row[0]: row[1] for row in cur.fetchall()}
+
+        if 5000 in best_by_dist:
+            est_5k_time_min = best_by_dist[5000] / 60
         else:
-            # Fallback if no recent data found
-            #TODO: Return a message indicating lack of data
-            est_5k_time_min = 30.0 # Default fallback
+            # Fallback for runs not scanned yet: fastest run >= 5km in the last 90 days.
+            # We use average_speed_mps (meters per second) to calculate 5k time.
+            query_speed = """
+                SELECT average_speed_mps 
+                FROM activities 
+                WHERE (type ILIKE '%%Run%%' OR sport_type ILIKE '%%Run%%')
+                AND distance_m >= 5000 
+                AND start_date_local >= %s
+                ORDER BY average_speed_mps DESC
+                LIMIT 1;
+            """
+            cur.execute(query_speed, (now - timedelta(days=90),))
+            result_speed = cur.fetchone()
+
+            if result_speed and result_speed[0]:
+                speed_mps = result_speed[0]
+                # Time = Distance / Speed
+                # 5000m / speed (m/s) = seconds. / 60 = minutes.
+                est_5k_time_min = (5000 / speed_mps) / 60
+            else:
+                # Fallback if no recent data found
+                #TODO: Return a message indicating lack of data
+                est_5k_time_min = 30.0 # Default fallback
 
         # --- CONSTRUCT OBJECT ---
         # Note: 'Age' is not in the activities table. 
@@ -72,11 +117,12 @@ def get_runner_stats(user_id: str) -> str:
             age=30, # Limitation: Data not in DB yet
             avg_weekly_km=round(avg_weekly_km, 2),
             recent_5k_time_min=round(est_5k_time_min, 1),
-            injury_status="None" 
+            injury_status="None",
+            race_predictions_min=predict_race_times(best_by_dist) or None
         )
         
         print(f"📊 [DB READ] Stats loaded for {user_id}: {real_stats.avg_weekly_km} km/wk, 5k est: {real_stats.recent_5k_time_min} min")
-        return real_stats.model_dump_json()
+        return pack(real_stats.model_dump(), label="get_runner_stats")
 
     except Exception as e:
         return f"Error fetching stats: {str(e)}"
@@ -92,22 +138,21 @@ def get_runner_stats(user_id: str) -> str:
 def save_training_plan(plan_data: str) -> str:
     """
     Saves a generated training plan to the PostgreSQL database.
-    Input 'plan_data' must be a valid JSON string with structure:
-    {
-      "user_id": "user_123",
-      "goal_description": "10k in 45m",
-      "workouts": [
-         {"date": "2026-01-01", "type": "Run", "distance_km": 5.0, "pace": "5:00", "description": "Easy run"}
-      ]
-    }
+    Input 'plan_data' must be a valid JSON string, compact table format:
+    {"u": "user_123", "goal": "10k in 45m", "start": "2026-01-01",
+     "cols": ["dd", "type", "km", "pace", "desc"],
+     "rows": [[0, "Easy", 5, "6:00", "Easy run"], [2, "Tempo", 8, "4:40", ""]]}
+    dd = days since the previous row (first row: days since "start").
+    The verbose format {"user_id", "goal_description", "workouts": [{"date", ...}]} is accepted too.
     """
     conn = None
     try:
-        # 1. Parse the Input JSON
+        # 1. Parse the Input JSON (compact or verbose, see app/utils/context_pack.py)
+        log_context_size("save_training_plan args", plan_data)
         try:
-            data = json.loads(plan_data)
-        except json.JSONDecodeError:
-            return "Error: Input was not valid JSON."
+            data = unpack_plan(json.loads(plan_data))
+        except (json.JSONDecodeError, ValueError, TypeError, AttributeError) as e:
+            return f"Error: Input was not a valid plan JSON ({e})."
 
         user_id = data.get("user_id")
         workouts = data.get("workouts", []) 
@@ -115,57 +160,18 @@ def save_training_plan(plan_data: str) -> str:
         if not user_id or not workouts:
             return "Error: JSON missing 'user_id' or 'workouts' list."
 
-        # 2. Sort workouts to determine start/end dates for the plan header
-        # We assume the AI put dates in "YYYY-MM-DD" format --> TODO Validate this
-        sorted_workouts = sorted(workouts, key=lambda x: x.get('date', '9999-12-31'))
-        start_date = sorted_workouts[0].get('date')
-        end_date = sorted_workouts[-1].get('date')
+        # 2. Validate against the domain models (dates must be YYYY-MM-DD, distances numbers...)
+        # before touching the DB, so the model gets a precise error to fix.
+        try:
+            user_id, plan = plan_from_payload(data)
+        except Exception as e:
+            return f"Error: Invalid plan ({e})."
 
+        # 3. Write it through the bulk import path (one transaction): supersedes the
+        # previous active plan, inserts the header (RETURNING plan_id) and the workouts.
         conn = get_db_connection()
-        cur = conn.cursor()
-
-        # 3. Insert the PLAN (Header)
-        # We use RETURNING plan_id to get the ID generated by Postgres
-        insert_plan_query = """
-            INSERT INTO training_plans (user_id, goal_description, start_date, end_date)
-            VALUES (%s, %s, %s, %s)
-            RETURNING plan_id;
-        """
-        cur.execute(insert_plan_query, (
-            user_id, 
-            data.get("goal_description", "Custom AI Plan"), 
-            start_date, 
-            end_date
-        ))
-        
-        plan_id = cur.fetchone()[0] # Capture the new ID
-
-        # 4. Prepare Workouts for Bulk Insert
-        workout_tuples = []
-        for w in workouts:
-            workout_tuples.append((
-                plan_id,
-                user_id,
-                w.get('date'),
-                w.get('type', 'Run'),
-                float(w.get('distance_km', 0)),
-                w.get('pace', ''), # Matches 'target_pace_min_per_km'
-                w.get('description', '')
-            ))
-
-        # 5. Insert WORKOUTS (Details)
-        insert_workouts_query = """
-            INSERT INTO workouts 
-            (plan_id, user_id, scheduled_date, workout_type, distance_km, target_pace_min_per_km, description)
-            VALUES (%s, %s, %s, %s, %s, %s, %s);
-        """
-        
-        # executemany is optimized for bulk inserts
-        cur.executemany(insert_workouts_query, workout_tuples)
+        plan_id = import_plans(conn, [(user_id, plan)])[0]
 
-        # 6. Commit the Transaction
-        conn.commit()
-        
         success_msg = f"✅ Success: Saved Plan ID {plan_id} with {len(workouts)} workouts."
         print(f"💾 [DB WRITE] {success_msg}")
         return success_msg
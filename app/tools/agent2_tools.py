@@ -1,30 +1,31 @@
 from datapizza.tools import tool
-from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 import os 
 load_dotenv()
 import json
+from datetime import date as _date, timedelta
 
-from app.utils.database import get_db_connection
+from app.utils.context_pack import log_context_size, pack, pack_workouts, unpack_workouts
+from app.utils.database import dict_cursor, get_db_connection
+from app.utils.plans import resolve_active_workout
+
+# Days of plan returned by compare_plan_vs_actual after the checked date
+UPCOMING_DAYS = 7
 
 
 @tool
 def compare_plan_vs_actual(user_id: str, date: str) -> str:
     """
     Compares the planned workout vs actual activity for a specific date (YYYY-MM-DD).
-    Returns a summary of compliance (e.g., "Planned 5k, Ran 0k").
+    Returns a summary of compliance (e.g., "Planned 5k, Ran 0k") and, under "next",
+    the plan's workouts of the following days as a compact workout table.
     """
     conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)#dovrei RealDictCursor sembra piu comodo per prendere i valori con i nomi delle colonne
+    cur = dict_cursor(conn)#dovrei RealDictCursor sembra piu comodo per prendere i valori con i nomi delle colonne
     try:
         # 1. Get the PLAN for that day
-        # TODO Better handling if multiple plans exist
-        cur.execute("""
-            SELECT plan_id, distance_km, target_pace_min_per_km, description
-            FROM workouts 
-            WHERE user_id = %s AND scheduled_date = %s
-        """, (user_id, date))
-        planned = cur.fetchone()
+        # Only the user's ACTIVE plan counts (older plans are 'superseded'), one indexed lookup.
+        planned = resolve_active_workout(cur, user_id, date)
         
         print(f'planned workout found: {planned}')
 
@@ -38,7 +39,7 @@ def compare_plan_vs_actual(user_id: str, date: str) -> str:
                    AVG(average_speed_mps) as avg_speed
             FROM activities 
             WHERE type ILIKE '%%Run%%' 
-            AND start_date_local::date = %s 
+            AND DATE(start_date_local) = %s 
         """, (date,))
         actual = cur.fetchone()
         
@@ -50,16 +51,36 @@ def compare_plan_vs_actual(user_id: str, date: str) -> str:
         # Simple logic: Did they do at least 80% of the distance?
         compliance_score = (actual_km / planned['distance_km']) * 100
         
+        # 4. The next week of the plan, in the same table format update_training_plan takes,
+        # so a reschedule can start from it instead of rebuilding the week from scratch
+        cur.execute("""
+            SELECT scheduled_date, workout_type, distance_km, target_pace_min_per_km, description
+            FROM workouts
+            WHERE plan_id = %s AND scheduled_date > %s AND scheduled_date <= %s
+            ORDER BY scheduled_date
+        """, (planned['plan_id'], date, (_date.fromisoformat(date) + timedelta(days=UPCOMING_DAYS)).isoformat()))
+        upcoming = [
+            {
+                "date": str(w['scheduled_date']),
+                "type": w['workout_type'],
+                "distance_km": w['distance_km'],
+                "pace": w['target_pace_min_per_km'],
+                "description": w['description'],
+            }
+            for w in cur.fetchall()
+        ]
+
         status = {
             "date": date,
             "plan_id": planned['plan_id'],
             "planned_km": planned['distance_km'],
             "actual_km": round(actual_km, 2),
             "compliance_percent": round(compliance_score, 1),
-            "verdict": "Missed" if compliance_score < 50 else "Good"
+            "verdict": "Missed" if compliance_score < 50 else "Good",
+            "upcoming_workouts": pack_workouts(upcoming),
         }
         
-        return json.dumps(status)
+        return pack(status, label="compare_plan_vs_actual")
 
     except Exception as e:
         return f"Agent_2: Error comparing data: {str(e)}"
@@ -72,12 +93,17 @@ def compare_plan_vs_actual(user_id: str, date: str) -> str:
 def update_training_plan(plan_id: int, new_workouts_json: str) -> str:
     """
     Updates the FUTURE workouts for an existing plan.
-    Input 'new_workouts_json' must be a list of workout objects.
+    Input 'new_workouts_json' is a compact workout table:
+    {"start": "2026-01-02", "cols": ["dd", "type", "km", "pace", "desc"],
+     "rows": [[0, "Easy", 5, "6:00", "Shake-out"], [3, "Long", 14, "5:45", ""]]}
+    dd = days since the previous row (first row: days since "start").
+    A verbose list of {"date", "type", "distance_km", "pace", "description"} objects is accepted too.
     WARNING: This deletes all existing workouts for this plan from the start date of the new list onwards.
     """
     conn = None
     try:
-        data = json.loads(new_workouts_json) # List of dicts
+        log_context_size("update_training_plan args", new_workouts_json)
+        data = unpack_workouts(json.loads(new_workouts_json)) # List of dicts
         if not data: return "No workouts provided."
 
         # Sort to find the "Cutoff Date" (The first date we are changing)
@@ -87,6 +113,14 @@ def update_training_plan(plan_id: int, new_workouts_json: str) -> str:
         conn = get_db_connection()
         cur = conn.cursor()
 
+        # 0. Check the plan: we need its user_id, and only the ACTIVE plan can be rescheduled
+        cur.execute("SELECT user_id, status FROM training_plans WHERE plan_id = %s", (plan_id,))
+        plan_row = cur.fetchone()
+        if not plan_row: raise Exception("Plan ID not found")
+        user_id, status = plan_row
+        if status != "active":
+            raise Exception(f"Plan {plan_id} is {status}, only the active plan can be updated")
+
         # 1. DELETE old future workouts (Clean the slate)
         # We don't touch the past! Only change the future.
         cur.execute("""
@@ -97,28 +131,17 @@ def update_training_plan(plan_id: int, new_workouts_json: str) -> str:
         deleted_count = cur.rowcount
 
         # 2. INSERT new workouts
-        workout_tuples = []
+        final_tuples = []
         for w in sorted_workouts:
-            workout_tuples.append((
+            final_tuples.append((
                 plan_id,
-                # We need user_id... typically we'd fetch it from the plan_id, 
-                # but let's assume the LLM passes it or we query it. 
-                # For simplicity, let's query the user_id from the plan first:
+                user_id,
                 w.get('date'),
                 w.get('type', 'Run'),
                 float(w.get('distance_km', 0)),
                 w.get('pace', ''), 
                 w.get('description', '')
             ))
-            
-        # Helper: Fetch user_id for this plan --> TODO Optimize
-        cur.execute("SELECT user_id FROM training_plans WHERE plan_id = %s", (plan_id,))
-        user_row = cur.fetchone()
-        if not user_row: raise Exception("Plan ID not found")
-        user_id = user_row[0]
-
-        # Re-build tuples with user_id
-        final_tuples = [(t[0], user_id, *t[1:]) for t in workout_tuples]
 
         cur.executemany("""
             INSERT INTO workouts 
@@ -133,4 +156,158 @@ def update_training_plan(plan_id: int, new_workouts_json: str) -> str:
         if conn: conn.rollback()
         return f"Update failed: {e}"
     finally:
-        if conn: conn.close()
\ No newline at end of file
+        if conn: conn.close()
+
+
+@tool
+def get_intensity_distribution(user_id: str, weeks: int = 4) -> str:
+    """
+    Returns the time spent in each HR and pace zone (Z1..Z5) for the last `weeks` weeks,
+    plus a polarization summary (share of easy Z1-Z2 vs hard Z4-Z5 time).
+    Reads the precomputed weekly_zones rollup, never the raw streams.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Monday of the oldest week we want (weeks are Monday-based, like DATE_TRUNC('week'))
+        today = _date.today()
+        first_week = today - timedelta(days=today.weekday()) - timedelta(weeks=int(weeks) - 1)
+
+        # NOTE: no athlete filter yet, the DB only holds one athlete (see agent1).
+        cur.execute("""
+            SELECT week_start, zone_type, zone_index, SUM(seconds)
+            FROM weekly_zones
+            WHERE week_start >= %s
+            GROUP BY week_start, zone_type, zone_index
+            ORDER BY week_start, zone_type, zone_index
+        """, (first_week,))
+        rows = cur.fetchall()
+
+        if not rows:
+            return "No intensity data available for this period."
+
+        # Tabular: one row of Z1..Z5 minutes per week, oldest first, weeks implied by "from"
+        n_weeks = int(weeks)
+        by_type = {}
+        for week_start, zone_type, zone_index, seconds in rows:
+            if isinstance(week_start, str):
+                week_start = _date.fromisoformat(week_start[:10])
+            w = (week_start - first_week).days // 7
+            table = by_type.setdefault(zone_type, [[0.0] * 5 for _ in range(n_weeks)])
+            if 0 <= w < n_weeks and zone_index < 5:
+                table[w][zone_index] += seconds
+
+        def polarization(zones):
+            total = sum(zones) or 1.0
+            return {
+                "easy_pct": round(100 * (zones[0] + zones[1]) / total, 1),
+                "moderate_pct": round(100 * zones[2] / total, 1),
+                "hard_pct": round(100 * (zones[3] + zones[4]) / total, 1),
+            }
+
+        result = {
+            "from": first_week.isoformat(),
+            "min_per_week": {zt: [[round(s / 60, 1) for s in week] for week in table] for zt, table in by_type.items()},
+            "polarization": {zt: polarization([sum(col) for col in zip(*table)]) for zt, table in by_type.items()},
+        }
+        return pack(result, label="get_intensity_distribution")
+
+    except Exception as e:
+        return f"Agent_2: Error reading intensity data: {str(e)}"
+    finally:
+        conn.close()
+
+
+@tool
+def get_km_splits(user_id: str, date: str) -> str:
+    """
+    Returns the per-km splits of the runs done on `date` (YYYY-MM-DD): pace (min/km),
+    average heart rate and elevation change of every kilometer. Use it to tell an even
+    run from a blow-up (pace fading in the last km) or a too-fast start.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        day = _date.fromisoformat(date)
+        # NOTE: no athlete filter yet, the DB only holds one athlete (see agent1).
+        # Date range instead of DATE(...) so the start_date_local index can be used.
+        cur.execute("""
+            SELECT activity_id, split_index, distance_m, moving_time_s, average_heartrate, elevation_difference_m
+            FROM activity_splits
+            WHERE start_date_local >= %s AND start_date_local < %s
+            ORDER BY activity_id, split_index
+        """, (day, day + timedelta(days=1)))
+        rows = cur.fetchall()
+
+        if not rows:
+            return "No split data for this date (no run, or details not fetched yet)."
+
+        runs = {}
+        for activity_id, split_index, distance_m, moving_s, hr, elev in rows:
+            if not distance_m or not moving_s or distance_m < 100:
+                continue  # last few meters of a run: pace would be noise
+            pace_min_km = moving_s / 60 / (distance_m / 1000)
+            runs.setdefault(activity_id, []).append([split_index, round(pace_min_km, 2), hr, elev])
+
+        result = {
+            "date": date,
+            "cols": ["km", "pace_min_km", "hr", "elev_m"],
+            "runs": [{"id": activity_id, "rows": splits} for activity_id, splits in runs.items()],
+        }
+        return pack(result, label="get_km_splits")
+
+    except Exception as e:
+        return f"Agent_2: Error reading splits: {str(e)}"
+    finally:
+        conn.close()
+
+
+# Runs of the same route returned by get_route_history (most recent ones)
+ROUTE_HISTORY_RUNS = 10
+
+
+@tool
+def get_route_history(user_id: str, date: str) -> str:
+    """
+    For the runs done on `date` (YYYY-MM-DD): the earlier runs on the SAME route
+    (GPS route fingerprint), with date, km and pace (min/km), oldest first.
+    Use it to tell whether a run was slow for the athlete on that route, or just a hilly one.
+    """
+    from Scripts.routes import find_runs_on_same_route, route_pace_trend
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        day = _date.fromisoformat(date)
+        # NOTE: no athlete filter yet, the DB only holds one athlete (see agent1).
+        cur.execute("""
+            SELECT ar.activity_id, ar.route_id
+            FROM activity_routes ar
+            JOIN activities a ON a.strava_id = ar.activity_id
+            WHERE a.start_date_local >= %s AND a.start_date_local < %s
+            ORDER BY ar.activity_id
+        """, (day, day + timedelta(days=1)))
+        runs_of_day = cur.fetchall()
+
+        if not runs_of_day:
+            return "No GPS route for this date (no run, treadmill, or routes not indexed yet)."
+
+        routes = []
+        for activity_id, route_id in runs_of_day:
+            trend = route_pace_trend(conn, route_id)[-ROUTE_HISTORY_RUNS:]
+            routes.append({
+                "id": activity_id,
+                "similar_runs": len(find_runs_on_same_route(conn, activity_id)),
+                "rows": [
+                    [str(start)[:10], round((dist or 0) / 1000, 2), pace]
+                    for start, dist, _, pace in trend
+                ],
+            })
+
+        result = {"date": date, "cols": ["date", "km", "pace_min_km"], "routes": routes}
+        return pack(result, label="get_route_history")
+
+    except Exception as e:
+        return f"Agent_2: Error reading route history: {str(e)}"
+    finally:
+        conn.close()
@@ -0,0 +1,144 @@
+# =================
+# Compact encoding for what goes IN and OUT of the LLM context.
+# Every tool result and every plan payload the model writes is paid in tokens
+# (latency + cost) on each turn, so we keep them small:
+#   - short keys (SHORT_KEYS), no None values, floats rounded, no whitespace
+#   - workouts as a table: one "cols" header + "rows" lists instead of repeated dicts
+#   - dates delta-encoded: "start" + days since the previous row ("dd")
+# The decoders also accept the old verbose format, so older prompts keep working.
+# =================
+import json
+from datetime import date, timedelta
+
+# verbose key -> short key (the prompts explain the short ones)
+SHORT_KEYS = {
+    "user_id": "u",
+    "goal_description": "goal",
+    "avg_weekly_km": "wk_km",
+    "recent_5k_time_min": "5k_min",
+    "injury_status": "injury",
+    "race_predictions_min": "pred_min",
+    "planned_km": "plan_km",
+    "actual_km": "act_km",
+    "compliance_percent": "pct",
+    "upcoming_workouts": "next",
+    "polarization": "pol",
+    "easy_pct": "easy",
+    "moderate_pct": "mod",
+    "hard_pct": "hard",
+}
+LONG_KEYS = {short: long for long, short in SHORT_KEYS.items()}
+
+# Column order of a packed workout row
+WORKOUT_COLS = ["dd", "type", "km", "pace", "desc"]
+
+FLOAT_DIGITS = 2
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 chars per token for JSON-ish text): good enough to compare encodings."""
+    return (len(text) + 3) // 4
+
+
+def _shorten(obj):
+    if isinstance(obj, dict):
+        return {SHORT_KEYS.get(k, k): _shorten(v) for k, v in obj.items() if v is not None}
+    if isinstance(obj, (list, tuple)):
+        return [_shorten(v) for v in obj]
+    if isinstance(obj, float):
+        value = round(obj, FLOAT_DIGITS)
+        return int(value) if value.is_integer() else value
+    return obj
+
+
+def dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def pack(obj, label="tool"):
+    """
+    Compact JSON of a tool result (short keys, rounded floats, no whitespace).
+    Logs its estimated size (the packed string only: no second serialization per call).
+    """
+    packed = dumps(_shorten(obj))
+    log_context_size(label, packed)
+    return packed
+
+
+def log_context_size(label, packed, verbose=None):
+    tokens = estimate_tokens(packed)
+    if verbose is None:
+        print(f"📦 [CTX] {label}: ~{tokens} tokens")
+    else:
+        print(f"📦 [CTX] {label}: ~{tokens} tokens (verbose ~{estimate_tokens(verbose)})")
+    return tokens
+
+
+# -----------------------------------
+# WORKOUTS (tabular + delta-encoded dates)
+# -----------------------------------
+def pack_workouts(workouts):
+    """
+    [{"date", "type", "distance_km", "pace", "description"}, ...] ->
+    {"start": "YYYY-MM-DD", "cols": WORKOUT_COLS, "rows": [[dd, type, km, pace, desc], ...]}
+    where dd = days since the previous row (the first row counts from "start").
+    """
+    ordered = sorted(workouts, key=lambda w: str(w["date"]))
+    if not ordered:
+        return {"start": None, "cols": WORKOUT_COLS, "rows": []}
+    start = date.fromisoformat(str(ordered[0]["date"])[:10])
+    rows, prev = [], start
+    for w in ordered:
+        day = date.fromisoformat(str(w["date"])[:10])
+        rows.append(_shorten([
+            (day - prev).days,
+            w.get("type", "Run"),
+            float(w.get("distance_km") or 0),
+            w.get("pace") or "",
+            w.get("description") or "",
+        ]))
+        prev = day
+    return {"start": start.isoformat(), "cols": WORKOUT_COLS, "rows": rows}
+
+
+def unpack_workouts(payload):
+    """
+    Inverse of pack_workouts. Also accepts the verbose list of workout dicts,
+    which is returned as is. Raises ValueError on a malformed table.
+    """
+    if isinstance(payload, list):
+        return payload
+    if not isinstance(payload, dict) or "rows" not in payload:
+        raise ValueError("workouts must be a list or a {'start', 'rows'} table")
+
+    cols = payload.get("cols") or WORKOUT_COLS
+    day = date.fromisoformat(payload["start"])
+    workouts = []
+    for row in payload["rows"]:
+        values = dict(zip(cols, row))
+        day = day + timedelta(days=int(values.get("dd", 0)))
+        workouts.append({
+            "date": day.isoformat(),
+            "type": values.get("type", "Run"),
+            "distance_km": float(values.get("km", 0)),
+            "pace": values.get("pace", ""),
+            "description": values.get("desc", ""),
+        })
+    return workouts
+
+
+def unpack_plan(data):
+    """
+    Plan payload written by the planner, compact or verbose ->
+    {"user_id", "goal_description", "workouts": [verbose workout dicts]}.
+    Compact: {"u": ..., "goal": ..., "start": ..., "rows": [...]}
+    """
+    data = {LONG_KEYS.get(k, k): v for k, v in data.items()}
+    if "rows" in data:
+        workouts = unpack_workouts(data)
+    else:
+        workouts = unpack_workouts(data.get("workouts", []))
+    plan = {"user_id": data.get("user_id"), "goal_description": data.get("goal_description")}
+    plan = {k: v for k, v in plan.items() if v is not None}  # callers apply their own defaults
+    plan["workouts"] = workouts
+    return plan
@@ -1,11 +1,33 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from app.config import Config  
+import re
+
+from app.config import Config
+
+# =================
+# Storage backends, selected with Config.DB_BACKEND:
+#   "postgres" (default): psycopg2 connection, as before.
+#   "sqlite": embedded file DB (Config.SQLITE_PATH), zero server, for single-athlete
+#             installs and CI. The tools keep writing Postgres-flavoured SQL:
+#             SqliteConnection translates the few constructs we use (see _to_sqlite).
+# =================
+
+_schema_ready = False
+
 
 def get_db_connection():
     """
-    Establishes connection to the Postgres DB using credentials from Config.
+    Establishes connection to the configured DB (Postgres by default, see Config.DB_BACKEND).
     """
+    if Config.DB_BACKEND == "sqlite":
+        conn = _connect_sqlite()
+    else:
+        conn = _connect_postgres()
+    _ensure_plan_tables(conn)
+    return conn
+
+
+def _connect_postgres():
+    import psycopg2  # lazy: commands that never touch the DB don't pay for it
+
     try:
         conn = psycopg2.connect(
             database=Config.POSTGRES_DB,
@@ -17,4 +39,255 @@ def get_db_connection():
         return conn
     except Exception as e:
         print(f"❌ Database Connection Error: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+def _connect_sqlite():
+    import sqlite3
+
+    try:
+        raw = sqlite3.connect(
+            Config.SQLITE_PATH,
+            detect_types=sqlite3.PARSE_DECLTYPES,  # TIMESTAMP / DATE columns come back as datetime / date
+            check_same_thread=False,
+        )
+        raw.execute("PRAGMA foreign_keys = ON")
+        raw.execute("PRAGMA journal_mode = WAL")
+        return SqliteConnection(raw)
+    except Exception as e:
+        print(f"❌ Database Connection Error: {e}")
+        raise e
+
+
+def dict_cursor(conn):
+    """Cursor returning rows as dicts (RealDictCursor on Postgres)."""
+    if isinstance(conn, SqliteConnection):
+        return conn.cursor(cursor_factory=dict)
+    from psycopg2.extras import RealDictCursor
+
+    return conn.cursor(cursor_factory=RealDictCursor)
+
+
+def bulk_insert(cur, sql, rows, page_size=1000, fetch=False):
+    """
+    Multi-row INSERT written with a single "VALUES %s" placeholder (psycopg2 execute_values
+    style). Postgres: one statement per `page_size` rows. SQLite: executemany in-process.
+    fetch=True (for "... RETURNING ..."): returns the returned rows, in the order of `rows`.
+    """
+    if not rows:
+        return [] if fetch else None
+    if isinstance(cur, SqliteCursor):
+        row_placeholder = "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+        single_row_sql = sql.replace("VALUES %s", f"VALUES {row_placeholder}", 1)
+        if not fetch:
+            cur.executemany(single_row_sql, rows)
+            return None
+        # sqlite3's executemany can't return rows: one in-process execute per row
+        returned = []
+        for row in rows:
+            cur.execute(single_row_sql, row)
+            returned.append(cur.fetchone())
+        return returned
+
+    from psycopg2.extras import execute_values
+
+    return execute_values(cur, sql, rows, page_size=page_size, fetch=fetch)
+
+
+def bulk_update(cur, sql, row_sql, rows, page_size=1000):
+    """
+    Many-row UPDATE. Postgres: `sql` is an "UPDATE ... FROM (VALUES %s) AS v(...)" statement
+    run with execute_values (one round trip per `page_size` rows). SQLite: `row_sql`,
+    the one-row equivalent with one %s per value of a row, through executemany (in-process).
+    """
+    if not rows:
+        return
+    if isinstance(cur, SqliteCursor):
+        cur.executemany(row_sql, rows)
+        return
+
+    from psycopg2.extras import execute_values
+
+    execute_values(cur, sql, rows, page_size=page_size)
+
+
+# -----------------------------------
+# SCHEMA: training plans (written by the agents)
+# -----------------------------------
+def create_plan_tables(conn):
+    """Creates training_plans / workouts if they don't exist (same schema on both backends)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS training_plans (
+                plan_id SERIAL PRIMARY KEY,
+                user_id VARCHAR(100) NOT NULL,
+                goal_description TEXT,
+                start_date DATE,
+                end_date DATE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status VARCHAR(20) NOT NULL DEFAULT 'active',   -- 'active' | 'superseded'
+                superseded_by INTEGER,
+                superseded_at TIMESTAMP
+            );
+        """)
+        # Tables created before the active-plan columns existed
+        cur.execute("ALTER TABLE training_plans ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'active';")
+        cur.execute("ALTER TABLE training_plans ADD COLUMN IF NOT EXISTS superseded_by INTEGER;")
+        cur.execute("ALTER TABLE training_plans ADD COLUMN IF NOT EXISTS superseded_at TIMESTAMP;")
+        # Old DBs can have several "active" plans per user: only the newest one stays active
+        cur.execute("""
+            UPDATE training_plans SET status = 'superseded'
+            WHERE status = 'active'
+            AND plan_id NOT IN (
+                SELECT MAX(plan_id) FROM training_plans WHERE status = 'active' GROUP BY user_id
+            );
+        """)
+        # At most ONE active plan per user, and it's what resolve_active_workout looks up
+        cur.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_training_plans_active_user
+            ON training_plans (user_id) WHERE status = 'active';
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS workouts (
+                workout_id SERIAL PRIMARY KEY,
+                plan_id INTEGER REFERENCES training_plans (plan_id) ON DELETE CASCADE,
+                user_id VARCHAR(100) NOT NULL,
+                scheduled_date DATE,
+                workout_type VARCHAR(50),
+                distance_km REAL,
+                target_pace_min_per_km VARCHAR(20),
+                description TEXT
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_workouts_plan_date
+            ON workouts (plan_id, scheduled_date);
+        """)
+    conn.commit()
+
+
+def _ensure_plan_tables(conn):
+    """Runs create_plan_tables once per process (fresh installs work out of the box)."""
+    global _schema_ready
+    if not _schema_ready:
+        create_plan_tables(conn)
+        _schema_ready = True
+
+
+# -----------------------------------
+# SQLITE ADAPTER
+# -----------------------------------
+_ADD_COLUMN_IF_NOT_EXISTS = re.compile(
+    r"ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+IF\s+NOT\s+EXISTS\s+(\w+)\s+(.+?);?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_SQLITE_REWRITES = [
+    (re.compile(r"\bSERIAL\s+PRIMARY\s+KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bILIKE\b", re.I), "LIKE"),  # SQLite LIKE is already case-insensitive (ASCII)
+    (re.compile(r"\bIS\s+DISTINCT\s+FROM\b", re.I), "IS NOT"),
+    (re.compile(r"\bNOW\(\)", re.I), "datetime('now', 'localtime')"),
+    # Monday of the week, like Postgres' DATE_TRUNC('week', col)::date
+    (re.compile(r"DATE_TRUNC\('week',\s*([\w.]+)\)::date", re.I), r"date(\1, '-6 days', 'weekday 1')"),
+]
+
+
+def _to_sqlite(sql, params):
+    """
+    Postgres-flavoured SQL -> SQLite. Handles what the repo uses: %s placeholders
+    (incl. `IN %s` with a tuple), %%, ILIKE, IS DISTINCT FROM, NOW(), SERIAL and
+    DATE_TRUNC('week', col)::date.
+    """
+    for pattern, repl in _SQLITE_REWRITES:
+        sql = pattern.sub(repl, sql)
+    if params is None:
+        return sql, None  # like psycopg2: no params -> % is not special
+
+    out_params = []
+    it = iter(params)
+
+    def placeholder(match):
+        if match.group(0) == "%%":
+            return "%"
+        value = next(it)
+        if isinstance(value, (tuple, list)):  # `IN %s` with a tuple -> IN (?, ?, ...)
+            out_params.extend(value)
+            return "(" + ", ".join("?" * len(value)) + ")"
+        out_params.append(value)
+        return "?"
+
+    sql = re.sub(r"%%|%s", placeholder, sql)
+    return sql, out_params
+
+
+class SqliteCursor:
+    """psycopg2-like cursor over sqlite3: context manager, %s params, optional dict rows."""
+
+    def __init__(self, raw_conn, dict_rows=False):
+        self._conn = raw_conn
+        self._cur = raw_conn.cursor()
+        self._dict_rows = dict_rows
+
+    def execute(self, sql, params=None):
+        match = _ADD_COLUMN_IF_NOT_EXISTS.match(sql.strip())
+        if match:
+            table, column, col_type = match.groups()
+            existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                self._cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+            return
+        sql, params = _to_sqlite(sql, params)
+        self._cur.execute(sql, params or ())
+
+    def executemany(self, sql, seq_of_params):
+        sql, _ = _to_sqlite(sql, None)
+        sql = re.sub(r"%%|%s", lambda m: "%" if m.group(0) == "%%" else "?", sql)
+        self._cur.executemany(sql, seq_of_params)
+
+    def _row(self, row):
+        if row is None or not self._dict_rows:
+            return row
+        return {col[0]: value for col, value in zip(self._cur.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cur.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class SqliteConnection:
+    """Wraps sqlite3.Connection so the tools can use it exactly like a psycopg2 connection."""
+
+    def __init__(self, raw_conn):
+        self._conn = raw_conn
+
+    def cursor(self, cursor_factory=None):
+        # Any cursor_factory (RealDictCursor in practice) means "rows as dicts"
+        return SqliteCursor(self._conn, dict_rows=cursor_factory is not None)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,148 @@
+# =================
+# Active-plan helpers. A user can have many plans over time, but only ONE is
+# 'active' (partial unique index idx_training_plans_active_user): the others are
+# 'superseded' and point to the plan that replaced them.
+# The resolver takes a cursor and never commits: the caller owns the transaction.
+# The bulk import at the bottom (used by save_training_plan too) takes a connection
+# and commits once.
+# =================
+
+
+def resolve_active_workout(cur, user_id, date):
+    """
+    Active plan + its workout for (user, date) in ONE indexed lookup
+    (partial index on active plans -> (plan_id, scheduled_date) on workouts).
+    Returns a row with plan_id, workout_id, distance_km, target_pace_min_per_km,
+    description — or None if the active plan has nothing scheduled that day.
+    """
+    cur.execute("""
+        SELECT p.plan_id, w.workout_id, w.distance_km, w.target_pace_min_per_km, w.description
+        FROM training_plans p
+        JOIN workouts w ON w.plan_id = p.plan_id AND w.scheduled_date = %s
+        WHERE p.user_id = %s AND p.status = 'active'
+        ORDER BY w.workout_id
+        LIMIT 1
+    """, (date, user_id))
+    return cur.fetchone()
+
+
+# -----------------------------------
+# BULK IMPORT (many plans, one transaction)
+# -----------------------------------
+def plan_from_payload(data):
+    """
+    Plan payload in the save_training_plan format (verbose dict, after
+    context_pack.unpack_plan) -> (user_id, TrainingPlan). Raises ValueError / ValidationError.
+    """
+    from app.domain.models import TrainingPlan, Workout
+
+    user_id = data.get("user_id")
+    if not user_id:
+        raise ValueError("missing 'user_id'")
+    workouts = [
+        Workout(
+            date=str(w.get("date", "")),
+            workout_type=w.get("type", "Run"),
+            distance_km=float(w.get("distance_km", 0)),
+            description=w.get("description", ""),
+            target_pace=w.get("pace") or None,
+        )
+        for w in data.get("workouts", [])
+    ]
+    if not workouts:
+        raise ValueError("missing 'workouts' list")
+    return user_id, TrainingPlan(goal=data.get("goal_description") or "Custom AI Plan", workouts=workouts)
+
+
+def import_plans(conn, plans, page_size=1000):
+    """
+    Writes many (user_id, TrainingPlan) pairs in ONE transaction:
+      1 UPDATE to supersede the users' active plans,
+      multi-row INSERTs for all headers (RETURNING plan_id) and all workouts,
+      one multi-row UPDATE for the superseded_by links.
+    The last plan of each user in `plans` becomes their active plan, earlier ones are
+    stored as superseded. Returns the new plan_ids, in input order. Rolls back on error.
+    """
+    from app.utils.database import bulk_insert, bulk_update
+
+    plans = list(plans)
+    if not plans:
+        return []
+
+    # Last occurrence of each user wins the 'active' status
+    last_index = {user_id: i for i, (user_id, _) in enumerate(plans)}
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE training_plans SET status = 'superseded', superseded_at = NOW()
+                WHERE status = 'active' AND user_id IN %s
+                RETURNING plan_id, user_id
+            """, (tuple(last_index),))
+            previous_active = {user_id: plan_id for plan_id, user_id in cur.fetchall()}
+
+            headers = []
+            for i, (user_id, plan) in enumerate(plans):
+                dates = sorted(w.date for w in plan.workouts)
+                status = "active" if last_index[user_id] == i else "superseded"
+                headers.append((user_id, plan.goal, dates[0], dates[-1], status))
+            # RETURNING rows come back in VALUES order
+            plan_ids = [row[0] for row in bulk_insert(cur, """
+                INSERT INTO training_plans (user_id, goal_description, start_date, end_date, status)
+                VALUES %s
+                RETURNING plan_id
+            """, headers, page_size=page_size, fetch=True)]
+
+            # superseded_by chains: previous active plan -> first new plan -> ... -> active one.
+            # Plans inserted already superseded get their superseded_at here (the previous
+            # active plans keep the one set by the UPDATE above).
+            links = []
+            latest = dict(previous_active)
+            for plan_id, (user_id, _) in zip(plan_ids, plans):
+                if latest.get(user_id) is not None:
+                    links.append((plan_id, latest[user_id]))
+                latest[user_id] = plan_id
+            bulk_update(cur, """
+                UPDATE training_plans p
+                SET superseded_by = v.superseded_by, superseded_at = COALESCE(p.superseded_at, NOW())
+                FROM (VALUES %s) AS v (superseded_by, plan_id)
+                WHERE p.plan_id = v.plan_id
+            """, """
+                UPDATE training_plans
+                SET superseded_by = %s, superseded_at = COALESCE(superseded_at, NOW())
+                WHERE plan_id = %s
+            """, links, page_size=page_size)
+
+            workout_rows = [
+                (plan_id, user_id, w.date, w.workout_type, w.distance_km, w.target_pace or "", w.description)
+                for plan_id, (user_id, plan) in zip(plan_ids, plans)
+                for w in plan.workouts
+            ]
+            bulk_insert(cur, """
+                INSERT INTO workouts
+                (plan_id, user_id, scheduled_date, workout_type, distance_km, target_pace_min_per_km, description)
+                VALUES %s
+            """, workout_rows, page_size=page_size)
+        conn.commit()
+        return plan_ids
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def import_plan_payloads(conn, payloads):
+    """
+    Validates ALL payloads before writing anything, then import_plans.
+    Raises ValueError listing every invalid payload (by index).
+    """
+    from app.utils.context_pack import unpack_plan
+
+    plans, errors = [], []
+    for i, data in enumerate(payloads):
+        try:
+            plans.append(plan_from_payload(unpack_plan(data)))
+        except Exception as e:
+            errors.append(f"#{i}: {e}")
+    if errors:
+        raise ValueError(f"{len(errors)} invalid plan(s): " + "; ".join(errors[:20]))
+    return import_plans(conn, plans)
@@ -0,0 +1,198 @@
+# =================
+# Record / replay LLM client, for offline and deterministic agent benchmarks.
+#   LLM_MODE=live   (default) the real client, nothing recorded
+#   LLM_MODE=record the real client, every exchange appended to a JSONL fixture
+#   LLM_MODE=replay no network: responses come from the fixture, after a simulated latency
+# With replay, a run of run_planner_pipeline / run_coach_pipeline only measures
+# our own overhead (tools, DB, orchestration) plus a fixed, known LLM delay.
+# =================
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+from datapizza.core.clients import ClientResponse
+from datapizza.core.clients.client import Client
+
+from app.config import Config
+
+
+def fixture_path(name):
+    """Fixture file of one agent, e.g. fixtures/llm/planner.jsonl"""
+    return os.path.join(Config.LLM_FIXTURES_DIR, f"{name}.jsonl")
+
+
+def client_for(fixture_name, make_live_client):
+    """
+    The client the agents should use for the configured Config.LLM_MODE.
+    `make_live_client` builds the real client; it is NOT called in replay mode
+    (no API key needed offline).
+    """
+    mode = Config.LLM_MODE
+    if mode == "live":
+        return make_live_client()
+    if mode == "record":
+        return RecordReplayClient(fixture_path(fixture_name), inner=make_live_client())
+    if mode == "replay":
+        return RecordReplayClient(fixture_path(fixture_name), latency_s=Config.LLM_REPLAY_LATENCY_S)
+    raise ValueError(f"❌ Unknown LLM_MODE '{mode}' (use live, record or replay)")
+
+
+def _conversation_key(input, memory, system_prompt):
+    """Hash of everything the model sees in one call: system prompt, history, new input."""
+    parts = [system_prompt or ""]
+    for turn in memory or []:
+        parts.append(str(getattr(turn, "role", "")))
+        parts.extend(json.dumps(block.to_dict(), sort_keys=True, default=str) for block in turn.blocks)
+    parts.extend(json.dumps(block.to_dict(), sort_keys=True, default=str) for block in input or [])
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class RecordReplayClient(Client):
+    """
+    Same interface as the datapizza clients, so an Agent can't tell the difference.
+
+    Record: pass `inner` (the real client). Each call goes to inner and is appended to `path` as
+            {"key", "latency_s", "response": ClientResponse.to_dict()}.
+            Streaming / structured calls are passed to inner but not recorded (the agents
+            don't use them): in replay they raise NotImplementedError.
+    Replay: no `inner`. Each call returns the recorded response with the same conversation key;
+            if the conversation drifted (e.g. different DB contents) the next unused record is
+            returned instead, in recording order. `latency_s`: fixed simulated delay per call,
+            None = the latency measured while recording.
+    """
+
+    def __init__(self, path, inner=None, latency_s=None, system_prompt=""):
+        super().__init__(
+            model_name=inner.model_name if inner else "replay",
+            system_prompt=inner.system_prompt if inner else system_prompt,
+            temperature=inner.temperature if inner else None,
+        )
+        self.path = path
+        self.inner = inner
+        self.latency_s = latency_s
+        if inner is not None:
+            self.memory_adapter = getattr(inner, "memory_adapter", None)
+        self._lock = threading.Lock()
+        self._records = []
+        self._used = set()
+        if inner is None:
+            self._load()
+
+    @property
+    def recording(self):
+        return self.inner is not None
+
+    def rewind(self):
+        """Replay the fixture from the start again (one benchmark iteration = one full fixture)."""
+        with self._lock:
+            self._used.clear()
+
+    # -----------------------------------
+    # FIXTURE I/O
+    # -----------------------------------
+    def _load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"❌ No LLM fixture at {self.path}: run once with LLM_MODE=record")
+        with open(self.path, encoding="utf-8") as f:
+            self._records = [json.loads(line) for line in f if line.strip()]
+
+    def _append(self, key, response, latency_s):
+        record = {"key": key, "latency_s": round(latency_s, 4), "response": response.to_dict()}
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def _next_record(self, key):
+        with self._lock:
+            index = next(
+                (i for i, r in enumerate(self._records) if i not in self._used and r["key"] == key),
+                None,
+            )
+            if index is None:
+                index = next((i for i in range(len(self._records)) if i not in self._used), None)
+                if index is None:
+                    raise RuntimeError(f"❌ LLM fixture {self.path} exhausted ({len(self._records)} calls recorded)")
+                print(f"⚠️ [REPLAY] conversation differs from the recording, using call #{index}")
+            self._used.add(index)
+            return self._records[index]
+
+    def _rebuild(self, record, tools):
+        """ClientResponse from the fixture, with function calls bound to the live Tool objects."""
+        response = ClientResponse.from_dict(record["response"])
+        tools_by_name = {t.name: t for t in tools or []}
+        for block in response.content:
+            name = getattr(block, "name", None)
+            if hasattr(block, "tool") and name in tools_by_name:
+                block.tool = tools_by_name[name]  # from_dict gives a Tool without its function
+        return response
+
+    def _delay(self, record):
+        return self.latency_s if self.latency_s is not None else record.get("latency_s", 0.0)
+
+    # -----------------------------------
+    # CLIENT INTERFACE
+    # -----------------------------------
+    def _invoke(self, input, tools=None, memory=None, tool_choice="auto", temperature=None,
+                max_tokens=None, system_prompt=None, **kwargs):
+        key = _conversation_key(input, memory, system_prompt)
+        if self.recording:
+            start = time.perf_counter()
+            response = self.inner._invoke(
+                input=input, tools=tools, memory=memory, tool_choice=tool_choice,
+                temperature=temperature, max_tokens=max_tokens, system_prompt=system_prompt, **kwargs,
+            )
+            self._append(key, response, time.perf_counter() - start)
+            return response
+
+        record = self._next_record(key)
+        time.sleep(self._delay(record))
+        return self._rebuild(record, tools)
+
+    async def _a_invoke(self, input, tools=None, memory=None, tool_choice="auto", temperature=None,
+                        max_tokens=None, system_prompt=None, **kwargs):
+        key = _conversation_key(input, memory, system_prompt)
+        if self.recording:
+            start = time.perf_counter()
+            response = await self.inner._a_invoke(
+                input=input, tools=tools, memory=memory, tool_choice=tool_choice,
+                temperature=temperature, max_tokens=max_tokens, system_prompt=system_prompt, **kwargs,
+            )
+            self._append(key, response, time.perf_counter() - start)
+            return response
+
+        record = self._next_record(key)
+        await asyncio.sleep(self._delay(record))
+        return self._rebuild(record, tools)
+
+    # Streaming and structured output are passed through to the real client while recording,
+    # but not written to the fixture: replay refuses them when the client is built.
+    def _stream_invoke(self, *args, **kwargs):
+        self._require_inner("streaming")
+        yield from self.inner._stream_invoke(*args, **kwargs)
+
+    async def _a_stream_invoke(self, *args, **kwargs):
+        self._require_inner("streaming")
+        async for response in self.inner._a_stream_invoke(*args, **kwargs):
+            yield response
+
+    def _structured_response(self, *args, **kwargs):
+        self._require_inner("structured output")
+        return self.inner._structured_response(*args, **kwargs)
+
+    async def _a_structured_response(self, *args, **kwargs):
+        self._require_inner("structured output")
+        return await self.inner._a_structured_response(*args, **kwargs)
+
+    def _convert_tool_choice(self, tool_choice):
+        # Provider format: the real client's while recording; replay sends nothing anywhere
+        if self.recording:
+            return self.inner._convert_tool_choice(tool_choice)
+        return tool_choice
+
+    def _require_inner(self, feature):
+        if not self.recording:
+            raise NotImplementedError(f"❌ LLM_MODE=replay does not support {feature} (only invoke / a_invoke are recorded)")
@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+os.environ.setdefault("STRAVA_CLIENT_ID", "0")  # read at import by the connector
+
+from Scripts import strava_connector as sc  # noqa: E402
+from Scripts.strava_connector import payload_hash, raw_activity_row  # noqa: E402
+
+# One activity as returned by GET /athlete/activities
+RAW_ACTIVITY = {
+    "id": 12345678901,
+    "athlete": {"id": 42},
+    "name": "Morning Run",
+    "description": None,
+    "type": "Run",
+    "sport_type": "TrailRun",
+    "workout_type": 2,
+    "timezone": "(GMT+01:00) Europe/Rome",
+    "start_date_local": "2025-03-01T07:30:00Z",
+    "distance": 10012.5,
+    "moving_time": 3005,
+    "elapsed_time": 3120,
+    "total_elevation_gain": 84.0,
+    "elev_high": 212.4,
+    "elev_low": 130.1,
+    "average_speed": 3.332,
+    "max_speed": 5.1,
+    "average_cadence": 86.2,
+    "has_heartrate": True,
+    "average_heartrate": 151.3,
+    "max_heartrate": 176,
+    "heartrate_opt_out": False,
+    "display_hide_heartrate_option": True,
+    "calories": 702,
+    "average_temp": 9,
+    "suffer_score": 61,
+    "map": {"summary_polyline": ""},
+}
+
+
+def test_raw_row_column_types():
+    row = raw_activity_row(RAW_ACTIVITY)
+    assert row[4:6] == ("Run", "TrailRun")
+    assert row[8].isoformat() == "2025-03-01T07:30:00"  # naive TIMESTAMP
+    assert row[10:12] == (3005, 3120)
+    # REAL columns are floats whatever JSON number Strava sent (176 vs 176.0)
+    assert row[20] == 176.0 and isinstance(row[20], float)
+    assert row[23:26] == (702.0, 9.0, None) and isinstance(row[24], float)
+
+
+@pytest.fixture
+def captured_rows(monkeypatch):
+    """Runs run_sync and run_backfill against RAW_ACTIVITY, without API or DB: returns the rows each wrote."""
+    captured = {}
+    mode = {"name": None}
+
+    class _Conn:
+        def close(self):
+            pass
+
+    def fake_raw_get(path, params=None):
+        assert path == "/athlete"
+        return {"id": 42, "firstname": "Zio", "lastname": "Pera"}, None
+
+    def fake_insert(conn, rows):
+        captured[mode["name"]] = rows
+        return {"inserted": len(rows), "updated": 0, "unchanged": 0}
+
+    monkeypatch.setattr(sc, "raw_get", fake_raw_get)
+    monkeypatch.setattr(sc, "iter_activities", lambda *a, **k: iter([dict(RAW_ACTIVITY)]))
+    monkeypatch.setattr(sc, "get_db_connection", lambda: _Conn())
+    monkeypatch.setattr(sc, "insert_activity_rows", fake_insert)
+    for name in ("create_activities_table", "create_best_efforts_table", "create_zone_tables",
+                 "create_detail_tables", "create_route_tables", "sync_hr_zones",
+                 "process_activity_details", "process_routes"):
+        monkeypatch.setattr(sc, name, lambda *a, **k: None)
+    monkeypatch.setattr(sc, "process_activity_streams", lambda *a, **k: False)
+
+    mode["name"] = "sync"
+    sc.run_sync(limit=50)
+    mode["name"] = "backfill"
+    sc.run_backfill()
+    return captured
+
+
+def test_sync_and_backfill_write_the_same_row(captured_rows):
+    assert captured_rows["sync"] == captured_rows["backfill"] == [raw_activity_row(RAW_ACTIVITY)]
+
+
+def test_sync_and_backfill_hash_the_same_activity_alike(captured_rows):
+    # A backfill followed by a sync must count the activity as "unchanged", not "updated"
+    (sync_row,), (backfill_row,) = captured_rows["sync"], captured_rows["backfill"]
+    assert payload_hash(sync_row) == payload_hash(backfill_row)
+    # Strava may send 176 in one listing and 176.0 in another: still the same activity
+    refetched = dict(RAW_ACTIVITY, max_heartrate=176.0, calories=702.0, distance=10012.5)
+    assert payload_hash(raw_activity_row(refetched)) == payload_hash(backfill_row)
+
+
+def test_payload_hash_ignores_value_types():
+    row = raw_activity_row(RAW_ACTIVITY)
+    # Same values with other Python types (176 vs 176.0): repr differs, the hash must not
+    retyped = tuple(int(v) if isinstance(v, float) and v.is_integer() else v for v in row)
+    assert repr(retyped) != repr(row)
+    assert payload_hash(retyped) == payload_hash(row)
+    changed = row[:2] + ("Evening Run",) + row[3:]
+    assert payload_hash(changed) != payload_hash(row)
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("duckdb")
+
+from Scripts.archive import _write_partitions, connect_archive  # noqa: E402
+
+KEY, DATE_COL, OWNER_COL = ["strava_id"], "start_date_local", "athlete_id"
+
+
+def _activities(rows):
+    return pd.DataFrame(rows, columns=["strava_id", "athlete_id", "name", "start_date_local"])
+
+
+def _archived(archive_dir):
+    con = connect_archive(str(archive_dir))
+    try:
+        return con.execute("SELECT strava_id, athlete_id, name FROM activities ORDER BY strava_id").fetchall()
+    finally:
+        con.close()
+
+
+def test_same_owner_same_partition_with_or_without_nulls(tmp_path):
+    root = str(tmp_path / "activities")
+    # First full export: one row predates athlete_id (NULL) -> pandas makes the column float
+    _write_partitions(_activities([
+        (1, 42, "Morning Run", "2025-03-01 07:30:00"),
+        (2, None, "Old Run", "2025-03-02 07:30:00"),
+    ]), root, KEY, DATE_COL, OWNER_COL)
+    # Incremental batch without NULLs (int column): the edited activity must replace its old copy
+    _write_partitions(_activities([
+        (1, 42, "Edited", "2025-03-01 07:30:00"),
+    ]), root, KEY, DATE_COL, OWNER_COL)
+
+    assert sorted(p.name for p in (tmp_path / "activities").iterdir()) == ["athlete_id=0", "athlete_id=42"]
+    assert _archived(tmp_path) == [(1, 42, "Edited"), (2, 0, "Old Run")]
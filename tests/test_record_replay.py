@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("datapizza")
+
+from datapizza.agents import Agent  # noqa: E402
+from datapizza.core.clients import ClientResponse  # noqa: E402
+from datapizza.core.clients.client import Client  # noqa: E402
+from datapizza.tools import tool  # noqa: E402
+from datapizza.type import FunctionCallBlock, TextBlock  # noqa: E402
+
+from app.utils.record_replay import RecordReplayClient  # noqa: E402
+
+CALLS = []
+
+
+@tool
+def weekly_km(user_id: str) -> str:
+    """Returns the weekly km of the user."""
+    CALLS.append(user_id)
+    return "42"
+
+
+class ScriptedClient(Client):
+    """Plays the 'real' LLM: first turn calls weekly_km, second turn answers with its result."""
+
+    def __init__(self):
+        super().__init__(model_name="scripted", system_prompt="")
+        self.n_calls = 0
+
+    def _reply(self, tools):
+        self.n_calls += 1
+        if self.n_calls % 2 == 1:
+            call = FunctionCallBlock(id="c1", arguments={"user_id": "u1"}, name="weekly_km", tool=tools[0])
+            return ClientResponse(content=[call])
+        return ClientResponse(content=[TextBlock(content="You run 42 km a week.")])
+
+    def _invoke(self, input, tools=None, memory=None, tool_choice="auto", temperature=None,
+                max_tokens=None, system_prompt=None, **kwargs):
+        return self._reply(tools)
+
+    async def _a_invoke(self, input, tools=None, memory=None, tool_choice="auto", temperature=None,
+                        max_tokens=None, system_prompt=None, **kwargs):
+        return self._reply(tools)
+
+    def _stream_invoke(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def _a_stream_invoke(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def _structured_response(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def _a_structured_response(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def _convert_tool_choice(self, tool_choice):
+        return {"mode": tool_choice}
+
+
+def _agent(client):
+    return Agent(name="test", client=client, system_prompt="You are a test.", tools=[weekly_km])
+
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "llm" / "test.jsonl")
+    inner = ScriptedClient()
+    recorder = RecordReplayClient(path, inner=inner)
+    assert recorder._convert_tool_choice("auto") == {"mode": "auto"}
+
+    recorded = _agent(recorder).run("How much do I run?")
+    assert recorded.text == "You run 42 km a week."
+    assert inner.n_calls == 2
+
+    CALLS.clear()
+    replayer = RecordReplayClient(path, latency_s=0)
+    assert replayer._convert_tool_choice("auto") == "auto"
+    replayed = _agent(replayer).run("How much do I run?")
+    assert replayed.text == recorded.text
+    assert CALLS == ["u1"]  # the replayed function call still runs the live tool
+
+    # async path, same fixture from the start
+    replayer.rewind()
+    replayed = asyncio.run(_agent(replayer).a_run("How much do I run?"))
+    assert replayed.text == recorded.text
+
+
+def test_replay_needs_a_fixture(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        RecordReplayClient(str(tmp_path / "missing.jsonl"))
+
+
+def test_replay_refuses_structured_output(tmp_path):
+    path = tmp_path / "empty.jsonl"
+    path.write_text("")
+    with pytest.raises(NotImplementedError):
+        RecordReplayClient(str(path))._structured_response(input=[], output_cls=None)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from Scripts.stats import best_efforts_from_stream, seconds_in_zones
+
+
+# -----------------------------------
+# seconds_in_zones
+# -----------------------------------
+def test_seconds_in_zones_drops_pauses():
+    # 10 samples at 1 s, a 600 s pause, 10 more samples at 1 s
+    time = np.concatenate([np.arange(10), 609 + np.arange(10)])
+    hr = np.full(20, 150.0)
+    totals = seconds_in_zones(hr, time, (0, 125, 145, 160, 175))
+    # 9 + 9 one-second steps; the pause and the last sample (dt = 0) count nothing
+    assert totals == [0.0, 0.0, 18.0, 0.0, 0.0]
+
+
+def test_seconds_in_zones_bins_by_lower_bound():
+    time = np.arange(5)
+    hr = np.array([100.0, 130.0, 150.0, 170.0, 180.0])
+    totals = seconds_in_zones(hr, time, (0, 125, 145, 160, 175))
+    assert totals == [1.0, 1.0, 1.0, 1.0, 0.0]  # last sample owns no time
+
+
+def test_seconds_in_zones_ignores_nan_and_bad_input():
+    time = np.arange(4)
+    hr = np.array([130.0, np.nan, 130.0, 130.0])
+    assert seconds_in_zones(hr, time, (0, 125))[1] == 2.0
+    assert seconds_in_zones([1.0], [0.0], (0, 125)) == [0.0, 0.0]
+    assert seconds_in_zones([1.0, 2.0], [0.0], (0, 125)) == [0.0, 0.0]
+
+
+# -----------------------------------
+# best_efforts_from_stream
+# -----------------------------------
+def test_best_efforts_constant_pace():
+    # 4 m/s for 3000 s = 12 km
+    time = np.arange(0, 3001, 1.0)
+    distance = 4.0 * time
+    efforts = best_efforts_from_stream(distance, time, targets=(1000, 5000, 10000, 21097))
+    assert set(efforts) == {1000, 5000, 10000}  # too short for a half
+    assert efforts[1000][0] == pytest.approx(250.0)
+    assert efforts[5000][0] == pytest.approx(1250.0)
+    assert efforts[10000][0] == pytest.approx(2500.0)
+
+
+def test_best_efforts_finds_fastest_segment():
+    # 2 km easy at 2.5 m/s, then 1 km fast at 5 m/s, then 1 km easy
+    t1 = np.arange(0, 801, 1.0)                    # 0 -> 2000 m
+    t2 = 800 + np.arange(1, 201, 1.0)              # 2000 -> 3000 m
+    t3 = 1000 + np.arange(1, 401, 1.0)             # 3000 -> 4000 m
+    time = np.concatenate([t1, t2, t3])
+    distance = np.concatenate([2.5 * t1, 2000 + 5.0 * (t2 - 800), 3000 + 2.5 * (t3 - 1000)])
+    elapsed, offset = best_efforts_from_stream(distance, time, targets=(1000,))[1000]
+    assert elapsed == pytest.approx(200.0)
+    assert offset == pytest.approx(800.0)
+
+
+def test_best_efforts_interpolates_between_samples():
+    # 10 s samples at 3 m/s: 1000 m is reached between two samples (333.3 s)
+    time = np.arange(0, 401, 10.0)
+    distance = 3.0 * time
+    elapsed, _ = best_efforts_from_stream(distance, time, targets=(1000,))[1000]
+    assert elapsed == pytest.approx(1000 / 3)
+
+
+def test_best_efforts_tolerates_gps_dips_and_bad_input():
+    time = np.arange(0, 11, 1.0)
+    distance = np.array([0, 100, 200, 190, 300, 400, 500, 600, 700, 800, 900], dtype=float)
+    assert 400 in best_efforts_from_stream(distance, time, targets=(400,))
+    assert best_efforts_from_stream([0.0], [0.0]) == {}
+    assert best_efforts_from_stream([0.0, 1.0], [0.0]) == {}
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("datapizza")
+
+from datapizza.tools import tool  # noqa: E402
+
+from app.agents.threaded_tools import threaded_tool  # noqa: E402
+
+
+@tool
+def which_thread(user_id: str, weeks: int = 4) -> str:
+    """Returns the name of the thread it runs in."""
+    return f"{user_id}:{weeks}:{threading.current_thread().name}"
+
+
+def test_threaded_tool_keeps_the_schema():
+    wrapped = threaded_tool(which_thread)
+    assert wrapped.schema == which_thread.schema
+    assert wrapped.name == "which_thread"
+
+
+def test_threaded_tool_runs_off_the_event_loop():
+    wrapped = threaded_tool(which_thread)
+
+    async def call():
+        return threading.current_thread().name, await wrapped(user_id="u1")
+
+    loop_thread, result = asyncio.run(call())
+    user_id, weeks, tool_thread = result.split(":")
+    assert (user_id, weeks) == ("u1", "4")
+    assert tool_thread != loop_thread